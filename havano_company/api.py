@@ -1,7 +1,18 @@
+import hashlib
+
 import frappe
 from frappe import _
-from .utils import create_response
-from frappe.utils import now_datetime
+from frappe.utils import cint, flt, now_datetime
+
+from .apis.company_pool import POOL_PREFIX
+from .apis.exchange_rates import MAX_EXCHANGE_RATE_REQUESTS, get_cached_exchange_rate
+from .apis.idempotency import claim_idempotency_key, complete_idempotency_key
+from .apis.pricing import get_price_index_version, get_price_list_prices
+from .apis.sales_summary import get_user_sales_totals
+from .apis.submission_queue import auto_submit, defer_submission, submit_or_defer
+from .apis.user_permissions import resolve_user_permissions
+from .apis.utils import create_response, decode_cursor, encode_cursor
+
 
 @frappe.whitelist()
 def test_api(name):
@@ -38,9 +49,9 @@ def create_pos_opening_entry():
             "balance_details": data.get("balance_details")
         })
 
-        # Insert and submit the document
+        # Insert and submit the document, unless the after_insert hook already did
         pos_opening_entry.insert()
-        pos_opening_entry.submit()
+        submit_or_defer(pos_opening_entry)
 
         # Commit the transaction
         frappe.db.commit()
@@ -52,8 +63,14 @@ def create_pos_opening_entry():
         frappe.log_error(message=str(e), title="Error creating POS Opening Entry")
         return
 
+INVENTORY_EXPORT_SPOOL_SIZE = 8 * 1024 * 1024
+
 @frappe.whitelist()
-def get_inventory():
+def get_inventory(format=None, company=None, warehouse=None):
+    # Back-office sync jobs ask for the NDJSON export, which does not hold the rows in memory
+    if format == "ndjson":
+        return export_inventory(company, warehouse)
+
     # Fetch price list, inventory, and item price list
     try:
         price_list = frappe.get_all("Price List", fields = ["price_list_name","currency"])
@@ -66,30 +83,90 @@ def get_inventory():
         frappe.log_error(message=str(e), title="Error fetching inventory data")
         return
 
+def export_inventory(company=None, warehouse=None):
+    """
+    Export price lists, stock and item prices as newline-delimited JSON
+
+    Rows are read through an unbuffered cursor and written one line at a time to a
+    spooled file that moves to disk past INVENTORY_EXPORT_SPOOL_SIZE, so memory stays
+    bounded however many rows there are. Every line carries a "type" of
+    "price_list", "inventory" or "item_price".
+
+    Args:
+        company: Only stock of this company's warehouses (optional)
+        warehouse: Only stock of this warehouse (optional)
+
+    Returns:
+        Response streaming the application/x-ndjson file
+    """
+    from tempfile import SpooledTemporaryFile
+
+    from werkzeug.wrappers import Response
+    from werkzeug.wsgi import wrap_file
+
+    try:
+        # The warehouses are already narrowed to the scoped companies
+        _companies, warehouses = get_stock_scope(company, warehouse)
+
+        values = {"warehouses": warehouses}
+        bin_condition = "bin.warehouse IN %(warehouses)s" if warehouses else "1 = 1"
+        price_condition = (
+            f"EXISTS (SELECT 1 FROM `tabBin` bin WHERE bin.item_code = ip.item_code AND {bin_condition})"
+            if warehouses else "1 = 1"
+        )
+
+        stream = SpooledTemporaryFile(max_size=INVENTORY_EXPORT_SPOOL_SIZE, mode="w+b")
+        write_ndjson(stream, "price_list", """
+            SELECT price_list_name, currency FROM `tabPrice List` ORDER BY name
+        """)
+        write_ndjson(stream, "inventory", f"""
+            SELECT bin.item_code, bin.valuation_rate, bin.warehouse, bin.actual_qty, bin.ordered_qty, bin.stock_value
+            FROM `tabBin` bin
+            WHERE {bin_condition}
+            ORDER BY bin.warehouse, bin.item_code
+        """, values)
+        # Prices only for items stocked in the exported warehouses
+        write_ndjson(stream, "item_price", f"""
+            SELECT ip.item_code, ip.uom, ip.price_list, ip.price_list_rate, ip.currency, ip.supplier
+            FROM `tabItem Price` ip
+            WHERE {price_condition}
+            ORDER BY ip.price_list, ip.item_code
+        """, values)
+        stream.seek(0)
+
+        response = Response(
+            wrap_file(frappe.local.request.environ, stream),
+            mimetype="application/x-ndjson",
+            direct_passthrough=True
+        )
+        response.headers["Content-Disposition"] = 'attachment; filename="inventory.ndjson"'
+        return response
+    except Exception as e:
+        create_response("417", {"error": str(e)})
+        frappe.log_error(message=str(e), title="Error exporting inventory data")
+        return
+
+def write_ndjson(stream, record_type, query, values=None):
+    """Write every row of `query` to `stream` as one JSON line tagged with `record_type`"""
+    with frappe.db.unbuffered_cursor():
+        for row in frappe.db.sql(query, values, as_dict=True, as_iterator=True):
+            row = {"type": record_type, **row}
+            stream.write(frappe.as_json(row, indent=None, separators=(",", ":")).encode())
+            stream.write(b"\n")
+
 @frappe.whitelist()
 def get_warehouses():
     try:
-        # Fetch inventory and warehouse details
-        inventory = frappe.get_all("Bin", fields=["item_code", "valuation_rate", "warehouse", "actual_qty", "ordered_qty", "stock_value"])
-        warehouses = frappe.get_all("Warehouse", fields=["name", "company", "account", "warehouse_type"])
-        
-        # Calculate total quantity and value for each warehouse
-        warehouse_inventory = {}
-        for item in inventory:
-            warehouse = item["warehouse"]
-            if warehouse not in warehouse_inventory:
-                warehouse_inventory[warehouse] = {
-                    "total_quantity": 0,
-                    "total_value": 0
-                }
-            warehouse_inventory[warehouse]["total_quantity"] += item["actual_qty"]
-            warehouse_inventory[warehouse]["total_value"] += item["stock_value"]
-
-        # Add total quantity and value to warehouse details
-        for warehouse in warehouses:
-            name = warehouse["name"]
-            warehouse["total_quantity"] = warehouse_inventory.get(name, {}).get("total_quantity", 0)
-            warehouse["total_value"] = warehouse_inventory.get(name, {}).get("total_value", 0)
+        # Totals come from the Warehouse Stock Total rollup, kept current from Bin changes
+        warehouses = frappe.db.sql("""
+            SELECT
+                w.name, w.company, w.account, w.warehouse_type,
+                COALESCE(t.total_quantity, 0) AS total_quantity,
+                COALESCE(t.total_value, 0) AS total_value
+            FROM `tabWarehouse` w
+            LEFT JOIN `tabWarehouse Stock Total` t ON t.name = w.name
+            WHERE w.company NOT LIKE %s
+        """, f"{POOL_PREFIX}%", as_dict=True)
         create_response("200", warehouses)
         return
     except Exception as e:
@@ -101,7 +178,8 @@ def get_warehouses():
 def get_cost_center():
     try:
         # Fetch cost center details
-        cost_center = frappe.get_all("Cost Center", fields = ["name","cost_center_name", "cost_center_number", "parent_cost_center", "company"])
+        # Unclaimed pool companies are nobody's, their cost centers are left out
+        cost_center = frappe.get_all("Cost Center", filters = {"company": ["not like", f"{POOL_PREFIX}%"]}, fields = ["name","cost_center_name", "cost_center_number", "parent_cost_center", "company"])
         create_response("200", cost_center)
         return
     except Exception as e:
@@ -111,8 +189,33 @@ def get_cost_center():
 
 @frappe.whitelist()
 def get_pos_profile():
+    # Scope to the caller's companies; users without a company permission see every profile
+    companies = resolve_user_permissions().get_allowed("Company")
+    filters = {"company": ["in", companies]} if companies else {}
+
     # Fetch POS profile details
-    pos_profiles = frappe.get_all("POS Profile", fields=["name", "company", "warehouse", "customer", "company_address", "cost_center","selling_price_list"])
+    pos_profiles = frappe.get_all("POS Profile", filters=filters, fields=["name", "company", "warehouse", "customer", "company_address", "cost_center","selling_price_list", "modified"], order_by="name asc")
+
+    # Saving a child row bumps the parent's modified, so the profiles alone version the payload
+    digest = hashlib.md5(
+        "|".join(f"{profile.name}:{profile.modified}" for profile in pos_profiles).encode()
+    ).hexdigest()
+    etag = f'"{digest}"'
+    frappe.local.response_headers.set("ETag", etag)
+
+    if frappe.get_request_header("If-None-Match") == etag:
+        frappe.local.response.http_status_code = 304
+        return
+
+    profile_names = [profile.name for profile in pos_profiles]
+    users_by_profile = {}
+    payments_by_profile = {}
+    if profile_names:
+        # Fetch applicable users and payment methods for all profiles at once
+        for row in frappe.get_all("POS Profile User", filters={"parenttype": "POS Profile", "parent": ["in", profile_names]}, fields=["parent", "user", "default"], order_by="idx asc"):
+            users_by_profile.setdefault(row.pop("parent"), []).append(row)
+        for row in frappe.get_all("POS Payment Method", filters={"parenttype": "POS Profile", "parent": ["in", profile_names]}, fields=["parent", "mode_of_payment", "default"], order_by="idx asc"):
+            payments_by_profile.setdefault(row.pop("parent"), []).append(row)
 
     response = []
 
@@ -124,65 +227,105 @@ def get_pos_profile():
             "customer": profile.customer,
             "company_address": profile.company_address,
             "cost_center": profile.cost_center,
-            "applicable_for_users": [],
-            "payments": [],
+            "applicable_for_users": users_by_profile.get(profile.name, []),
+            "payments": payments_by_profile.get(profile.name, []),
             "price_list": profile.selling_price_list
         }
 
-        # Fetch applicable users for the profile
-        try: 
-            if frappe.db.exists("POS Profile User",{"parent":profile.name}):
-                applicable_for_users = frappe.get_all("POS Profile User",filters={"parent": profile.name}, fields=["user","default"])
-                profile_data["applicable_for_users"] = applicable_for_users if applicable_for_users else []
-            else:
-                profile_data["applicable_for_users"] = []
-        except Exception as e: 
-            profile_data["applicable_for_users"] = []
-        
-        # Fetch payment methods for the profile
-        try: 
-            if frappe.db.exists("POS Payment Method",{"parent":profile.name}):
-               payments = frappe.get_all("POS Payment Method", filters={"parent": profile.name}, fields=["mode_of_payment", "default"])
-               profile_data["payments"] = payments if payments else []
-            else:
-                profile_data["payments"] = []
-        except Exception as e:
-            profile_data["payments"] = []
-
         response.append(profile_data)
 
+    frappe.response["etag"] = etag
     return response
 
+PRODUCTS_PAGE_LENGTH = 500
+
+
+def get_stock_scope(company=None, warehouse=None):
+    """
+    Work out the companies and warehouses the current user may read stock for
+
+    Args:
+        company: Narrow down to this company (optional, must be permitted)
+        warehouse: Narrow down to this warehouse (optional, must be permitted)
+
+    Returns:
+        tuple: (companies, warehouses), an empty list meaning unrestricted
+    """
+    permissions = resolve_user_permissions()
+    companies = permissions.get_allowed("Company")
+    warehouses = permissions.get_allowed("Warehouse")
+
+    if company:
+        if companies and company not in companies:
+            frappe.throw(_("You do not have access to this company"), frappe.PermissionError)
+        companies = [company]
+    if warehouse:
+        if warehouses and warehouse not in warehouses:
+            frappe.throw(_("You do not have access to this warehouse"), frappe.PermissionError)
+        warehouses = [warehouse]
+
+    if companies:
+        # Keep only warehouses of the scoped companies
+        warehouse_filters = {"company": ["in", companies]}
+        if warehouses:
+            warehouse_filters["name"] = ["in", warehouses]
+        warehouses = frappe.get_all("Warehouse", filters=warehouse_filters, pluck="name") or [None]
+
+    return companies, warehouses
+
+
 @frappe.whitelist()
-def get_products():
+def get_products(cursor=None, page_length=PRODUCTS_PAGE_LENGTH, company=None, warehouse=None):
     try:
-        # Fetch all necessary data for products in the "Products" item group
-        product_details = frappe.get_all("Item", 
-            filters={
-                'item_group': ["=", 'Products']
-            },
-            fields=["name","item_name", "item_code", "item_group", "is_stock_item"]
-        )
-        products_data = frappe.get_all("Bin", fields=["item_code", "warehouse", "actual_qty"])
-        price_lists = frappe.get_all("Item Price", fields=["price_list", "price_list_rate", "item_code"])
-        
-        # Initialize products dictionary with all items
+        companies, warehouses = get_stock_scope(company, warehouse)
+        page_length = min(cint(page_length) or PRODUCTS_PAGE_LENGTH, PRODUCTS_PAGE_LENGTH)
+
+        # Fetch one page of items in the "Products" item group, stocked in or
+        # defaulted to the user's company
+        values = {"limit": page_length + 1, "companies": companies, "warehouses": warehouses}
+        conditions = ["item.item_group = 'Products'"]
+        if cursor:
+            values["cursor"] = decode_cursor(cursor)[0]
+            conditions.append("item.item_code > %(cursor)s")
+        if companies:
+            conditions.append("""(
+                EXISTS (SELECT 1 FROM `tabBin` bin
+                    WHERE bin.item_code = item.item_code AND bin.warehouse IN %(warehouses)s)
+                OR EXISTS (SELECT 1 FROM `tabItem Default` item_default
+                    WHERE item_default.parent = item.name AND item_default.company IN %(companies)s)
+            )""")
+
+        product_details = frappe.db.sql(f"""
+            SELECT item.item_name, item.item_code, item.item_group, item.is_stock_item
+            FROM `tabItem` item
+            WHERE {" AND ".join(conditions)}
+            ORDER BY item.item_code
+            LIMIT %(limit)s
+        """, values, as_dict=True)
+
+        next_cursor = None
+        if len(product_details) > page_length:
+            product_details = product_details[:page_length]
+            next_cursor = encode_cursor(product_details[-1].item_code)
+
+        # Initialize products dictionary with the items of this page
         products = {detail['item_code']: {"warehouses": [], "prices": []} for detail in product_details}
 
-        # Add warehouse data
-        for product in products_data:
-            item_code = product["item_code"]
-            if item_code in products:
-                products[item_code]["warehouses"].append({
+        if products:
+            bin_filters = {"item_code": ["in", list(products)]}
+            if warehouses:
+                bin_filters["warehouse"] = ["in", warehouses]
+
+            # Add warehouse data
+            for product in frappe.get_all("Bin", filters=bin_filters, fields=["item_code", "warehouse", "actual_qty"]):
+                products[product["item_code"]]["warehouses"].append({
                     "warehouse": product["warehouse"],
                     "qtyOnHand": product["actual_qty"]
                 })
-        
-        # Add price list data
-        for price in price_lists:
-            item_code = price["item_code"]
-            if item_code in products:
-                products[item_code]["prices"].append({
+
+            # Add price list data
+            for price in frappe.get_all("Item Price", filters={"item_code": ["in", list(products)]}, fields=["price_list", "price_list_rate", "item_code"]):
+                products[price["item_code"]]["prices"].append({
                     "priceName": price["price_list"],
                     "price": price["price_list_rate"]
                 })
@@ -201,34 +344,70 @@ def get_products():
             }
             final_products.append(final_product)
         
-        create_response("200", {"products": final_products})
+        create_response("200", {"products": final_products, "next_cursor": next_cursor})
         return
     except Exception as e:
         create_response("417", {"error": str(e)})
         frappe.log_error(message=str(e), title="Error fetching products data")
         return
 
+SALES_INVOICE_PAGE_LENGTH = 100
+MAX_SALES_INVOICE_PAGE_LENGTH = 500
+
 @frappe.whitelist()
-def get_sales_invoice(user=None):
+def get_sales_invoice(user=None, cursor=None, page_length=SALES_INVOICE_PAGE_LENGTH, from_date=None, to_date=None, company=None, include_items=1):
     try:
         final_invoice = []
         # Return all invoices if user is Administrator, else filter by user
-        filters = {} if user == "Administrator" else {"owner": user} if user else {}
-        
-        sales_invoice_list = frappe.get_all("Sales Invoice", 
-            filters=filters,
-            fields=[
-                "name", "customer", "company", "customer_name",
-                "posting_date", "posting_time", "due_date",
-                "total_qty", "total", "total_taxes_and_charges",
-                "grand_total", "owner", "modified_by"
-            ])
-        
+        conditions = []
+        values = {
+            "from_date": from_date,
+            "to_date": to_date,
+            "company": company,
+            "limit": min(cint(page_length) or SALES_INVOICE_PAGE_LENGTH, MAX_SALES_INVOICE_PAGE_LENGTH)
+        }
+        if user and user != "Administrator":
+            conditions.append("owner = %(owner)s")
+            values["owner"] = user
+        if from_date:
+            conditions.append("posting_date >= %(from_date)s")
+        if to_date:
+            conditions.append("posting_date <= %(to_date)s")
+        if company:
+            conditions.append("company = %(company)s")
+        if cursor:
+            # Newest first, so the next page starts below the last (posting_date, name)
+            values["cursor_date"], values["cursor_name"] = decode_cursor(cursor)
+            conditions.append("""(posting_date < %(cursor_date)s
+                OR (posting_date = %(cursor_date)s AND name < %(cursor_name)s))""")
+
+        sales_invoice_list = frappe.db.sql(f"""
+            SELECT
+                name, customer, company, customer_name,
+                posting_date, posting_time, due_date,
+                total_qty, total, total_taxes_and_charges,
+                grand_total, owner, modified_by
+            FROM `tabSales Invoice`
+            {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ORDER BY posting_date DESC, name DESC
+            LIMIT %(limit)s
+        """, values, as_dict=True)
+
+        next_cursor = None
+        if len(sales_invoice_list) == values["limit"]:
+            next_cursor = encode_cursor(sales_invoice_list[-1].posting_date, sales_invoice_list[-1].name)
+
+        # Items of the whole page in one query
+        items_by_invoice = {}
+        if cint(include_items) and sales_invoice_list:
+            items = frappe.get_all("Sales Invoice Item",
+                filters={"parent": ["in", [invoice.name for invoice in sales_invoice_list]], "parenttype": "Sales Invoice"},
+                fields=["parent", "item_name", "qty", "rate", "amount"],
+                order_by="parent, idx")
+            for item in items:
+                items_by_invoice.setdefault(item.pop("parent"), []).append(item)
+
         for invoice in sales_invoice_list:
-            items = frappe.get_all("Sales Invoice Item", 
-                filters={"parent": invoice.name},
-                fields=["item_name", "qty", "rate", "amount"])
-                
             invoice = {
                 "name": invoice.name,
                 "customer": invoice.customer,
@@ -237,7 +416,6 @@ def get_sales_invoice(user=None):
                 "posting_date": invoice.posting_date,
                 "posting_time": invoice.posting_time,
                 "due_date": invoice.due_date,
-                "items": items,
                 "total_qty": invoice.total_qty,
                 "total": invoice.total,
                 "total_taxes_and_charges": invoice.total_taxes_and_charges,
@@ -245,51 +423,82 @@ def get_sales_invoice(user=None):
                 "created_by": invoice.owner,
                 "last_modified_by": invoice.modified_by
             }
+            if cint(include_items):
+                invoice["items"] = items_by_invoice.get(invoice["name"], [])
             final_invoice.append(invoice)
             
         create_response("200", final_invoice)
+        frappe.response["next_cursor"] = next_cursor
         return
     except Exception as e:
         create_response("417", {"error": str(e)})
         frappe.log_error(message=str(e), title="Error fetching sales invoice data")
         return
 
+USER_INVOICES_PAGE_LENGTH = 20
+
 @frappe.whitelist()
-def get_user():
+def get_user(summary_only=0, from_date=None, to_date=None, invoices_page_length=USER_INVOICES_PAGE_LENGTH):
     try:
         users = frappe.get_all("User", 
             fields=["email", "first_name", "last_name", "username", "gender", "location"])
-        
+
+        # Totals come from the per-user, per-day rollup of submitted invoices
+        totals = get_user_sales_totals(from_date, to_date)
+        for user in users:
+            user_totals = totals.get(user.email)
+            user["total_sales"] = user_totals.total_sales if user_totals else 0
+            user["total_invoices"] = cint(user_totals.total_invoices) if user_totals else 0
+
+        if cint(summary_only):
+            create_response("200", users)
+            return
+
+        # Latest invoices of every user in one query; further pages come from
+        # get_sales_invoice(user=..., cursor=invoices_cursor)
+        page_length = min(cint(invoices_page_length) or USER_INVOICES_PAGE_LENGTH, MAX_SALES_INVOICE_PAGE_LENGTH)
+        conditions = []
+        if from_date:
+            conditions.append("posting_date >= %(from_date)s")
+        if to_date:
+            conditions.append("posting_date <= %(to_date)s")
+        sales_invoices = frappe.db.sql(f"""
+            SELECT * FROM (
+                SELECT
+                    name, owner, posting_date, posting_time, due_date,
+                    customer, customer_name, company, total_qty, total,
+                    total_taxes_and_charges, grand_total, status,
+                    ROW_NUMBER() OVER (PARTITION BY owner ORDER BY posting_date DESC, name DESC) AS invoice_rank
+                FROM `tabSales Invoice`
+                {"WHERE " + " AND ".join(conditions) if conditions else ""}
+            ) ranked
+            WHERE invoice_rank <= %(page_length)s
+            ORDER BY owner, invoice_rank
+        """, {"from_date": from_date, "to_date": to_date, "page_length": page_length}, as_dict=True)
+
+        items_by_invoice = {}
+        if sales_invoices:
+            items = frappe.get_all("Sales Invoice Item",
+                filters={"parent": ["in", [invoice.name for invoice in sales_invoices]], "parenttype": "Sales Invoice"},
+                fields=["parent", "item_name", "qty", "rate", "amount"],
+                order_by="parent, idx")
+            for item in items:
+                items_by_invoice.setdefault(item.pop("parent"), []).append(item)
+
+        invoices_by_user = {}
+        for invoice in sales_invoices:
+            invoice.pop("invoice_rank")
+            invoice.items = items_by_invoice.get(invoice.name, [])
+            invoices_by_user.setdefault(invoice.pop("owner"), []).append(invoice)
+
         for user in users:
-            sales_invoices = frappe.get_all("Sales Invoice",
-                filters={"owner": user.email},
-                fields=[
-                    "name", 
-                    "posting_date",
-                    "posting_time", 
-                    "due_date",
-                    "customer",
-                    "customer_name",
-                    "company",
-                    "total_qty",
-                    "total",
-                    "total_taxes_and_charges", 
-                    "grand_total",
-                    "status"
-                ]
+            user_invoices = invoices_by_user.get(user.email, [])
+            user["sales_invoices"] = user_invoices
+            user["invoices_cursor"] = (
+                encode_cursor(user_invoices[-1].posting_date, user_invoices[-1].name)
+                if len(user_invoices) == page_length else None
             )
             
-            for invoice in sales_invoices:
-                # Get items for each invoice
-                invoice.items = frappe.get_all("Sales Invoice Item",
-                    filters={"parent": invoice.name},
-                    fields=["item_name", "qty", "rate", "amount"]
-                )
-            
-            user["sales_invoices"] = sales_invoices
-            user["total_sales"] = sum(invoice.grand_total for invoice in sales_invoices)
-            user["total_invoices"] = len(sales_invoices)
-            
         create_response("200", users)
         return
     except Exception as e:
@@ -298,15 +507,20 @@ def get_user():
         return
 
 @frappe.whitelist()
-def get_customer():
+def get_customer(use_cache=1):
     try:
-        default_cost_center = frappe.db.get_value("User Permission", {"user": frappe.session.user, "allow": "Cost Center", "is_default": 1}, "for_value")       
+        default_cost_center = resolve_user_permissions().get_default("Cost Center")
         # Fetch customer details with default price list
         customers = frappe.get_all("Customer", filters = {"custom_cost_center": default_cost_center, "default_price_list": ["!=", ""]} ,fields = ["customer_name","customer_type","custom_cost_center","custom_warehouse","gender","customer_pos_id","default_price_list"])
-        for customer in customers:
-            # Fetch item prices for each customer
-            customer.items = frappe.get_all("Item Price", filters = {"price_list":customer.default_price_list}, fields = ["item_code","item_name","price_list_rate"])
-        create_response("200", customers)
+        # Customers reference their price list by name; each distinct list is sent once
+        price_lists = list(dict.fromkeys(customer.default_price_list for customer in customers))
+        create_response("200", {
+            "customers": customers,
+            "price_lists": {
+                price_list: get_price_list_prices(price_list, use_cache=cint(use_cache)) for price_list in price_lists
+            },
+            "price_list_versions": {price_list: get_price_index_version(price_list) for price_list in price_lists}
+        })
         return
     except Exception as e:
         create_response("417", {"error": str(e)})
@@ -320,8 +534,9 @@ def get_account():
         accounts = frappe.get_all("Account", 
             filters={
                 "account_type": ["in", ["Cash", "Bank"]],
-                "is_group": 0
-
+                "is_group": 0,
+                # Unclaimed pool companies are nobody's
+                "company": ["not like", f"{POOL_PREFIX}%"]
             },
             fields=[
                 "name",
@@ -344,8 +559,6 @@ def get_account():
 @frappe.whitelist()
 def get_currency_exchange_rate():
     try:
-        from erpnext.setup.utils import get_exchange_rate
-        
         # Get form data
         data = frappe.local.form_dict
         
@@ -355,8 +568,8 @@ def get_currency_exchange_rate():
         transaction_date = data.get("transaction_date")
         args = data.get("args")  # Optional: for_buying/for_selling
         
-        # Get exchange rate using ERPNext's utility function
-        exchange_rate = get_exchange_rate(
+        # Get exchange rate using ERPNext's utility function, cached per pair and date
+        exchange_rate = get_cached_exchange_rate(
             from_currency=from_currency,
             to_currency=to_currency, 
             transaction_date=transaction_date,
@@ -376,32 +589,84 @@ def get_currency_exchange_rate():
         frappe.log_error(message=str(e), title="Error fetching exchange rate")
         return
 
+@frappe.whitelist()
+def get_currency_exchange_rates(rates):
+    """
+    Get the exchange rates of many currency pairs and dates in one call
+
+    Args:
+        rates: JSON list of {from_currency, to_currency, transaction_date (optional), args (optional)}
+
+    Returns:
+        Response with one rate per requested pair, in order
+    """
+    try:
+        rates = frappe.parse_json(rates) or []
+        if len(rates) > MAX_EXCHANGE_RATE_REQUESTS:
+            frappe.throw(_("At most {0} exchange rates can be requested at once").format(MAX_EXCHANGE_RATE_REQUESTS))
+
+        resolved = {}
+        exchange_rates = []
+        for rate in rates:
+            key = (rate.get("from_currency"), rate.get("to_currency"), rate.get("transaction_date"), rate.get("args"))
+            if key not in resolved:
+                resolved[key] = get_cached_exchange_rate(*key)
+            exchange_rates.append({
+                "exchange_rate": resolved[key],
+                "from_currency": key[0],
+                "to_currency": key[1],
+                "date": key[2],
+                "args": key[3]
+            })
+
+        create_response("200", {"exchange_rates": exchange_rates})
+        return
+
+    except Exception as e:
+        create_response("417", {"error": str(e)})
+        frappe.log_error(message=str(e), title="Error fetching exchange rates")
+        return
+
+def make_sales_invoice(invoice_data):
+    """Build an unsaved Sales Invoice from a till's invoice payload"""
+    return frappe.get_doc({
+        "doctype": "Sales Invoice",
+        "customer": invoice_data.get("customer"),
+        "company": invoice_data.get("company"),
+        "set_warehouse": invoice_data.get("set_warehouse"),
+        "cost_center": invoice_data.get("cost_center"),
+        "update_stock": invoice_data.get("update_stock"),
+        "posting_date": invoice_data.get("posting_date"),  # Added posting_date
+        "posting_time": invoice_data.get("posting_time"),
+        "items": [
+            {
+                "item_name": item.get("item_name"),
+                "item_code": item.get("item_code"),
+                "rate": item.get("rate"),
+                "qty": item.get("qty"),
+                "cost_center": item.get("cost_center")
+            }
+            for item in invoice_data.get("items", [])
+        ]
+    })
+
 @frappe.whitelist()
 def create_sales_invoice():
     invoice_data = frappe.local.form_dict
     try:
-        si_doc = frappe.get_doc({
-            "doctype": "Sales Invoice",
-            "customer": invoice_data.get("customer"),
-            "company": invoice_data.get("company"),
-            "set_warehouse": invoice_data.get("set_warehouse"),
-            "cost_center": invoice_data.get("cost_center"),
-            "update_stock": invoice_data.get("update_stock"),
-            "posting_date": invoice_data.get("posting_date"),  # Added posting_date
-            "posting_time": invoice_data.get("posting_time"),
-            "items": [
-                {
-                    "item_name": item.get("item_name"),
-                    "item_code": item.get("item_code"),
-                    "rate": item.get("rate"),
-                    "qty": item.get("qty"),
-                    "cost_center": item.get("cost_center")
-                }
-                for item in invoice_data.get("items", [])
-            ]
-        })
+        si_doc = make_sales_invoice(invoice_data)
         
         si_doc.insert()
+        # Opt-in: acknowledge the draft now and post the ledgers in the background
+        if cint(invoice_data.get("defer_submit")):
+            defer_submission(si_doc)
+            return {
+                "status": "queued",
+                "message": "Sales Invoice created, submission queued",
+                "invoice_name": si_doc.name,
+                "created_by": si_doc.owner,
+                "created_on": si_doc.creation
+            }
         si_doc.submit()
         
         return {
@@ -419,36 +684,132 @@ def create_sales_invoice():
             "message": str(e)
         }
 
+MAX_SYNC_INVOICES = 200
+
+@frappe.whitelist()
+def sync_sales_invoices(invoices):
+    """
+    Post a batch of invoices queued offline by a till
+
+    Every invoice carries the client's `idempotency_key` and is posted in its own
+    savepoint and committed on its own, so one failing invoice does not undo the
+    others and a timeout mid-batch keeps the invoices posted so far. A key that was
+    already posted returns the original invoice instead of creating a new one,
+    which makes replaying a batch after a timeout safe.
+
+    Args:
+        invoices: JSON list of invoice payloads as for create_sales_invoice, each with an idempotency_key
+
+    Returns:
+        dict: A result per invoice, in order: "created", "duplicate" or "error"
+    """
+    try:
+        invoices = frappe.parse_json(invoices) or []
+        if len(invoices) > MAX_SYNC_INVOICES:
+            frappe.throw(_("At most {0} invoices can be synced at once").format(MAX_SYNC_INVOICES))
+
+        results = []
+        for index, invoice_data in enumerate(invoices):
+            idempotency_key = invoice_data.get("idempotency_key")
+            savepoint = f"sync_invoice_{index}"
+            frappe.db.savepoint(savepoint)
+            try:
+                existing = claim_idempotency_key(idempotency_key, "Sales Invoice")
+                if existing:
+                    if existing.reference_doctype != "Sales Invoice":
+                        frappe.throw(_("Idempotency key {0} was used for a {1}").format(idempotency_key, existing.reference_doctype))
+                    frappe.db.release_savepoint(savepoint)
+                    results.append({
+                        "idempotency_key": idempotency_key,
+                        "status": "duplicate",
+                        "invoice_name": existing.reference_name
+                    })
+                    continue
+
+                si_doc = make_sales_invoice(invoice_data)
+                si_doc.insert()
+                si_doc.submit()
+                complete_idempotency_key(idempotency_key, si_doc.name)
+
+                frappe.db.commit()
+                results.append({
+                    "idempotency_key": idempotency_key,
+                    "status": "created",
+                    "invoice_name": si_doc.name,
+                    "created_by": si_doc.owner,
+                    "created_on": si_doc.creation
+                })
+            except Exception as e:
+                frappe.db.rollback(save_point=savepoint)
+                frappe.log_error(frappe.get_traceback(), "Sales Invoice Sync Error")
+                results.append({
+                    "idempotency_key": idempotency_key,
+                    "status": "error",
+                    "message": str(e)
+                })
+
+        return {
+            "status": "success",
+            "message": "Sales Invoices synced",
+            "results": results
+        }
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Sales Invoice Sync Error")
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+def make_payment_entry(payment_data):
+    """
+    Build an unsaved Payment Entry from a till's payment payload
+
+    Each entry of `references` allocates part of the payment to one document;
+    payloads without a list fall back to the single top-level reference fields.
+    """
+    references = get_payment_reference_list(payment_data)
+
+    return frappe.get_doc({
+        "doctype": "Payment Entry",
+        "payment_type": payment_data.get("payment_type"),
+        "company": payment_data.get("company"),
+        "mode_of_payment": payment_data.get("mode_of_payment"),
+        "party_type": payment_data.get("party_type"),
+        "party": payment_data.get("party"),
+        "paid_to_account_currency": payment_data.get("paid_to_account_currency"),
+        "paid_to": payment_data.get("paid_to"),
+        "paid_amount": payment_data.get("paid_amount"),
+        "received_amount": payment_data.get("received_amount"),
+        "target_exchange_rate": payment_data.get("target_exchange_rate"),
+        "reference_date": payment_data.get("reference_date"),
+        "reference_no": payment_data.get("reference_no"),
+        "references": [
+            {
+                "reference_doctype": ref.get("reference_doctype"),
+                "reference_name": ref.get("reference_name"),
+                "allocated_amount": ref.get("allocated_amount")
+            }
+            for ref in references
+        ]
+    })
+
 @frappe.whitelist()
 def create_payment_entry():
     payment_data = frappe.local.form_dict
     try:
-        # Create Payment Entry document using frappe.client.insert
-        pe_doc = frappe.new_doc({
-            "doctype": "Payment Entry",
-            "payment_type": payment_data.get("payment_type"),
-            "company": payment_data.get("company"),
-            "mode_of_payment": payment_data.get("mode_of_payment"),
-            "party_type": payment_data.get("party_type"),
-            "party": payment_data.get("party"),
-            "paid_to_account_currency": payment_data.get("paid_to_account_currency"),
-            "paid_to": payment_data.get("paid_to"),
-            "paid_amount": payment_data.get("paid_amount"),
-            "received_amount": payment_data.get("received_amount"),
-            "target_exchange_rate": payment_data.get("target_exchange_rate"),
-            "reference_date": payment_data.get("reference_date"),
-            "reference_no": payment_data.get("reference_no"),
-            "references": [
-                {
-                    "reference_doctype": payment_data.get("reference_doctype"),
-                    "reference_name": payment_data.get("reference_name"),
-                    "allocated_amount": payment_data.get("allocated_amount")
-                }
-                for ref in payment_data.get("references", [])
-
-            ]
-        }).insert()
+        pe_doc = make_payment_entry(payment_data)
+        pe_doc.insert()
         
+        # Opt-in: acknowledge the draft now and post the ledgers in the background
+        if cint(payment_data.get("defer_submit")):
+            defer_submission(pe_doc)
+            return {
+                "status": "queued",
+                "message": "Payment Entry created, submission queued",
+                "payment_entry": pe_doc
+            }
+
         # Submit the Payment Entry document
         pe_doc.submit()
         
@@ -466,22 +827,206 @@ def create_payment_entry():
             "message": str(e)
         }
 
+MAX_BULK_PAYMENTS = 200
+OUTSTANDING_DOCTYPES = {"Sales Invoice": "customer", "Purchase Invoice": "supplier", "POS Invoice": "customer"}
+
+def get_payment_reference_list(payment_data):
+    """
+    The references of a payment payload as a list of
+    {reference_doctype, reference_name, allocated_amount}; a payload without a
+    `references` list gives its top-level reference fields as the single entry
+    """
+    references = frappe.parse_json(payment_data.get("references")) or []
+    if not references and payment_data.get("reference_name"):
+        references = [payment_data]
+
+    return [
+        frappe._dict({
+            "reference_doctype": ref.get("reference_doctype"),
+            "reference_name": ref.get("reference_name"),
+            "allocated_amount": ref.get("allocated_amount")
+        })
+        for ref in references
+    ]
+
+def get_payment_references(payments):
+    """
+    Load every document referenced by a batch of payments in one query
+
+    Returns:
+        dict: {(reference_doctype, reference_name): row with docstatus, company, party and outstanding_amount}
+    """
+    names_by_doctype = {}
+    for payment in payments:
+        for ref in get_payment_reference_list(payment):
+            names_by_doctype.setdefault(ref.reference_doctype, set()).add(ref.reference_name)
+
+    # Unknown doctypes are left out and their references reported as not found
+    doctypes = frappe.get_all("DocType",
+        filters={"name": ["in", list(filter(None, names_by_doctype))], "istable": 0, "issingle": 0},
+        pluck="name"
+    ) if names_by_doctype else []
+
+    selects = []
+    values = {}
+    for index, doctype in enumerate(doctypes):
+        party_field = OUTSTANDING_DOCTYPES.get(doctype)
+        selects.append(f"""
+            SELECT %(doctype_{index})s AS reference_doctype, name, docstatus, company,
+                {f"`{party_field}`" if party_field else "NULL"} AS party,
+                {"outstanding_amount" if party_field else "NULL"} AS outstanding_amount
+            FROM `tab{doctype}`
+            WHERE name IN %(names_{index})s
+        """)
+        values[f"doctype_{index}"] = doctype
+        values[f"names_{index}"] = list(names_by_doctype[doctype])
+
+    if not selects:
+        return {}
+
+    return {
+        (row.reference_doctype, row.name): row
+        for row in frappe.db.sql(" UNION ALL ".join(selects), values, as_dict=True)
+    }
+
+def validate_payment_references(payment, references, allocated):
+    """
+    Check a payment's references against the preloaded documents
+
+    `allocated` carries what earlier payments of the batch already took from each
+    document, so two payments cannot both settle the same outstanding amount.
+    """
+    for ref in get_payment_reference_list(payment):
+        key = (ref.reference_doctype, ref.reference_name)
+        row = references.get(key)
+        if not row:
+            frappe.throw(_("{0} {1} not found").format(*key))
+        if row.docstatus != 1:
+            frappe.throw(_("{0} {1} is not submitted").format(*key))
+        if row.company != payment.get("company"):
+            frappe.throw(_("{0} {1} belongs to company {2}").format(*key, row.company))
+        if key[0] in OUTSTANDING_DOCTYPES:
+            if row.party != payment.get("party"):
+                frappe.throw(_("{0} {1} is not for party {2}").format(*key, payment.get("party")))
+            remaining = abs(flt(row.outstanding_amount)) - allocated.get(key, 0)
+            if flt(ref.allocated_amount) > remaining + 0.005:
+                frappe.throw(_("Allocated amount {0} exceeds the outstanding {1} of {2} {3}").format(
+                    ref.allocated_amount, remaining, *key))
+
+@frappe.whitelist()
+def create_payment_entries(payments):
+    """
+    Create many Payment Entries in one call, e.g. for end-of-day settlement
+
+    Every referenced document of the batch is loaded up front and checked for
+    company, party and outstanding amount. Each payment is then inserted and
+    submitted in its own savepoint and committed on its own, so one bad payment
+    does not undo the others.
+    Payments may carry an `idempotency_key` to make replaying the batch safe.
+
+    Args:
+        payments: JSON list of payment payloads as for create_payment_entry, each with a `references`
+            list or the top-level reference fields
+
+    Returns:
+        dict: A result per payment, in order: "created", "queued", "duplicate" or "error"
+    """
+    try:
+        payments = frappe.parse_json(payments) or []
+        if len(payments) > MAX_BULK_PAYMENTS:
+            frappe.throw(_("At most {0} payments can be created at once").format(MAX_BULK_PAYMENTS))
+
+        # Top-level reference fields become the `references` list, so validation and
+        # make_payment_entry see the same references
+        payments = [frappe._dict(payment_data) for payment_data in payments]
+        for payment_data in payments:
+            payment_data.references = get_payment_reference_list(payment_data)
+
+        references = get_payment_references(payments)
+        allocated = {}
+
+        results = []
+        for index, payment_data in enumerate(payments):
+            idempotency_key = payment_data.get("idempotency_key")
+            savepoint = f"bulk_payment_{index}"
+            frappe.db.savepoint(savepoint)
+            try:
+                if idempotency_key:
+                    existing = claim_idempotency_key(idempotency_key, "Payment Entry")
+                    if existing:
+                        if existing.reference_doctype != "Payment Entry":
+                            frappe.throw(_("Idempotency key {0} was used for a {1}").format(idempotency_key, existing.reference_doctype))
+                        frappe.db.release_savepoint(savepoint)
+                        results.append({
+                            "idempotency_key": idempotency_key,
+                            "status": "duplicate",
+                            "payment_entry": existing.reference_name
+                        })
+                        continue
+
+                validate_payment_references(payment_data, references, allocated)
+
+                pe_doc = make_payment_entry(payment_data)
+                pe_doc.insert()
+                if cint(payment_data.get("defer_submit")):
+                    defer_submission(pe_doc)
+                else:
+                    pe_doc.submit()
+                if idempotency_key:
+                    complete_idempotency_key(idempotency_key, pe_doc.name)
+
+                frappe.db.commit()
+                for ref in pe_doc.references:
+                    key = (ref.reference_doctype, ref.reference_name)
+                    allocated[key] = allocated.get(key, 0) + abs(flt(ref.allocated_amount))
+
+                results.append({
+                    "idempotency_key": idempotency_key,
+                    "status": "queued" if cint(payment_data.get("defer_submit")) else "created",
+                    "payment_entry": pe_doc.name
+                })
+            except Exception as e:
+                frappe.db.rollback(save_point=savepoint)
+                frappe.log_error(frappe.get_traceback(), "Bulk Payment Entry Error")
+                results.append({
+                    "idempotency_key": idempotency_key,
+                    "status": "error",
+                    "message": str(e)
+                })
+
+        return {
+            "status": "success",
+            "message": "Payment Entries processed",
+            "results": results
+        }
+
+    except Exception as e:
+        frappe.log_error(frappe.get_traceback(), "Bulk Payment Entry Error")
+        return {
+            "status": "error",
+            "message": str(e)
+        }
+
+# The POS after_insert hooks only submit for companies opted in through
+# `havano_auto_submit_pos`, otherwise POS drafts and held invoices stay drafts.
+# They defer to the submission queue when `havano_defer_pos_submission` is set.
+
 def submit_pos_opening_entry(doc,method):
     # Submit POS Opening Entry document
-    doc.submit()
+    auto_submit(doc)
 
 def submit_pos_closing_entry(doc, method=None):
     # Submit POS Closing Entry document
-    doc.submit()
+    auto_submit(doc)
 
 def submit_pos_invoice(doc, method=None):
     # Submit POS Invoice document
-    doc.submit()
+    auto_submit(doc)
 
 def submit_payment_entry(doc, method=None):
     # Submit Payment Entry document
-    doc.submit()
+    submit_or_defer(doc)
 
 def submit_sales_invoice(doc, method=None):
     # Submit Sales Invoice document
-    doc.submit()
\ No newline at end of file
+    submit_or_defer(doc)
@@ -8,6 +8,7 @@ import random
 import json
 import base64
 from .utils import create_response, check_user_has_company
+from .bootstrap import get_bootstrap
 from tzlocal import get_localzone
 import pytz
 
@@ -37,81 +38,8 @@ def login(usr,pwd, timezone):
        
     token_string = str(api_generate['api_key']) +":"+ str(api_generate['api_secret'])
 
-    # Get user permissions for warehouse and cost center
-    warehouses = frappe.get_list("User Permission", 
-        filters={
-            "user": user.name,
-            "allow": "Warehouse"
-        },
-        pluck="for_value",
-        ignore_permissions=True
-    )
-    
-    cost_centers = frappe.get_list("User Permission",
-        filters={
-            "user": user.name, 
-            "allow": "Cost Center"
-        },
-        pluck="for_value",
-        ignore_permissions=True
-    )
-    default_warehouse = frappe.db.get_value("User Permission", 
-        {"user": user.name, "allow": "Warehouse", "is_default": 1}, "for_value")
-    
-    default_cost_center = frappe.db.get_value("User Permission",
-        {"user": user.name, "allow": "Cost Center", "is_default": 1}, "for_value")
-
-    default_customer = frappe.db.get_value("User Permission",
-        {"user": user.name, "allow": "Customer", "is_default": 1}, "for_value") 
-
-    # Get items and their quantities from default warehouse
-    warehouse_items = []
-    if default_warehouse:
-        warehouse_items = frappe.db.sql("""
-            SELECT 
-                item.item_code,
-                item.item_name,
-                item.description,
-                item.stock_uom,
-                bin.actual_qty,
-                bin.projected_qty
-            FROM `tabItem` item
-            LEFT JOIN `tabBin` bin ON bin.item_code = item.item_code 
-            WHERE bin.warehouse = %s
-        """, default_warehouse, as_dict=1)
-
-    # Get customers with the same cost center as the default cost center
-    customers = []
-    if default_cost_center:
-        customers = frappe.get_list("Customer",
-            filters={
-                "custom_cost_center": default_cost_center
-            },
-            fields=["name", "customer_name", "customer_group", "territory", "custom_cost_center"],
-            ignore_permissions=True
-        )
-
-    # Get all docs created by or assigned to the user
-    company_registration = frappe.db.sql("""
-        SELECT name, organization_name, status, company, industry, country, city,company_status,subscription,days_left
-        FROM `tabCompany Registration`
-        WHERE user_created = %(user)s
-        OR name IN (
-            SELECT reference_name
-            FROM `tabToDo`
-            WHERE reference_type = 'Company Registration'
-                AND allocated_to = %(user)s
-        )
-    """, {"user": usr}, as_dict=True)
-
-    company_permission =frappe.db.get_all("User Permission",
-        filters={
-            "user": usr,
-            "allow": "Company Registration",
-        },
-        fields=["name", "allow", "for_value"],
-        ignore_permissions=True
-    )
+    bootstrap = get_bootstrap(user.name)
+    company_registration = bootstrap["company_registration"]
 
     # Check if user has company registration
     has_company = bool(company_registration)
@@ -131,15 +59,16 @@ def login(usr,pwd, timezone):
         "username":user.username or "",
         "full_name":user.full_name or "",
         "email":user.email or "",
-        "warehouse": default_warehouse,
-        "cost_center": default_cost_center,
-        "default_customer": default_customer,
-        "customers": customers,
-        "warehouse_items": warehouse_items,
+        "warehouse": bootstrap["warehouse"],
+        "cost_center": bootstrap["cost_center"],
+        "default_customer": bootstrap["default_customer"],
+        "customers": bootstrap["customers"],
+        "warehouse_items": bootstrap["warehouse_items"],
+        "warehouse_items_watermark": bootstrap["warehouse_items_watermark"],
         "time_zone": f"{local_tz}{erpnext_tz}",
-        "company" : company_registration[0].get("company") if company_registration else None,
+        "company" : company_registration.get("company") if company_registration else None,
         "has_company_registration": has_company,
-        "company_registration": company_registration[0] if company_registration else None,
+        "company_registration": company_registration,
         "company_message": company_message,
         "role": user.get("role_select") or "",
         "pin":user.get("pin")
@@ -265,61 +194,8 @@ def get_user_data():
         api_generate = generate_keys(user)
         token_string = f"{api_generate['api_key']}:{api_generate['api_secret']}"
 
-        # Get user permissions for warehouse and cost center
-        warehouses = frappe.get_list("User Permission",
-            filters={"user": user.name, "allow": "Warehouse"},
-            pluck="for_value", ignore_permissions=True
-        )
-        cost_centers = frappe.get_list("User Permission",
-            filters={"user": user.name, "allow": "Cost Center"},
-            pluck="for_value", ignore_permissions=True
-        )
-
-        default_warehouse = frappe.db.get_value("User Permission",
-            {"user": user.name, "allow": "Warehouse", "is_default": 1}, "for_value")
-        default_cost_center = frappe.db.get_value("User Permission",
-            {"user": user.name, "allow": "Cost Center", "is_default": 1}, "for_value")
-        default_customer = frappe.db.get_value("User Permission",
-            {"user": user.name, "allow": "Customer", "is_default": 1}, "for_value")
-
-        # Get warehouse items
-        warehouse_items = []
-        if default_warehouse:
-            warehouse_items = frappe.db.sql("""
-                SELECT 
-                    item.item_code,
-                    item.item_name,
-                    item.description,
-                    item.stock_uom,
-                    bin.actual_qty,
-                    bin.projected_qty
-                FROM `tabItem` item
-                LEFT JOIN `tabBin` bin ON bin.item_code = item.item_code 
-                WHERE bin.warehouse = %s
-            """, default_warehouse, as_dict=1)
-
-        # Customers linked to cost center
-        customers = []
-        if default_cost_center:
-            customers = frappe.get_list("Customer",
-                filters={"custom_cost_center": default_cost_center},
-                fields=["name", "customer_name", "customer_group", "territory", "custom_cost_center"],
-                ignore_permissions=True
-            )
-
-        # Company registration
-        company_registration = frappe.db.sql("""
-            SELECT name, organization_name, status, company, industry, country, city, 
-                company_status, subscription, days_left
-            FROM `tabCompany Registration`
-            WHERE user_created = %(user)s
-            OR name IN (
-                SELECT reference_name
-                FROM `tabToDo`
-                WHERE reference_type = 'Company Registration'
-                AND allocated_to = %(user)s
-            )
-        """, {"user": usr}, as_dict=True)
+        bootstrap = get_bootstrap(user.name)
+        company_registration = bootstrap["company_registration"]
 
         has_company = bool(company_registration)
         company_message = None if has_company else "You need to register your company to access all features."
@@ -333,14 +209,15 @@ def get_user_data():
             "username": user.username or "",
             "full_name": user.full_name or "",
             "email": user.email or "",
-            "warehouse": default_warehouse,
-            "cost_center": default_cost_center,
-            "default_customer": default_customer,
-            "customers": customers,
-            "warehouse_items": warehouse_items,
-            "company": company_registration[0].get("company") if company_registration else None,
+            "warehouse": bootstrap["warehouse"],
+            "cost_center": bootstrap["cost_center"],
+            "default_customer": bootstrap["default_customer"],
+            "customers": bootstrap["customers"],
+            "warehouse_items": bootstrap["warehouse_items"],
+            "warehouse_items_watermark": bootstrap["warehouse_items_watermark"],
+            "company": company_registration.get("company") if company_registration else None,
             "has_company_registration": has_company,
-            "company_registration": company_registration[0] if company_registration else None,
+            "company_registration": company_registration,
             "company_message": company_message,
             "role": user.get("role_select") or "",
             "pin": user.get("pin")
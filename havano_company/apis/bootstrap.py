@@ -0,0 +1,236 @@
+import frappe
+
+from havano_company.apis.sync import make_watermark
+from havano_company.apis.user_permissions import resolve_user_permissions
+
+BOOTSTRAP_KEY = "havano_bootstrap::{0}"
+WAREHOUSE_ITEMS_KEY = "havano_bootstrap_warehouse_items::{0}"
+CUSTOMERS_KEY = "havano_bootstrap_customers::{0}"
+STATS_KEY = "havano_bootstrap_stats::{0}"
+
+# Safety net for stock movements that update Bin without firing doc_events
+DEFAULT_BOOTSTRAP_TTL = 300
+
+
+def get_bootstrap(user):
+    """
+    Get the login bootstrap snapshot for a user, building it on a cache miss
+
+    Only the user's defaults and registration are cached per user. Warehouse items
+    and customers are cached once per warehouse and cost center and shared by every
+    till user on them.
+
+    Args:
+        user: User name (email)
+
+    Returns:
+        dict: Defaults, customers, warehouse items and company registration
+    """
+    cache = frappe.cache()
+    ttl = frappe.conf.get("havano_bootstrap_ttl") or DEFAULT_BOOTSTRAP_TTL
+
+    snapshot = cache.get_value(BOOTSTRAP_KEY.format(user))
+    if snapshot is None:
+        _count("misses")
+        snapshot = build_user_bootstrap(user)
+        cache.set_value(BOOTSTRAP_KEY.format(user), snapshot, expires_in_sec=ttl)
+    else:
+        _count("hits")
+
+    warehouse_items = None
+    if snapshot["warehouse"]:
+        warehouse_items = cache.get_value(WAREHOUSE_ITEMS_KEY.format(snapshot["warehouse"]))
+    if warehouse_items is None:
+        warehouse_items = build_warehouse_items(snapshot["warehouse"])
+        if snapshot["warehouse"]:
+            cache.set_value(WAREHOUSE_ITEMS_KEY.format(snapshot["warehouse"]), warehouse_items, expires_in_sec=ttl)
+
+    customers = None
+    if snapshot["cost_center"]:
+        customers = cache.get_value(CUSTOMERS_KEY.format(snapshot["cost_center"]))
+    if customers is None:
+        customers = build_customers(snapshot["cost_center"])
+        if snapshot["cost_center"]:
+            cache.set_value(CUSTOMERS_KEY.format(snapshot["cost_center"]), customers, expires_in_sec=ttl)
+
+    return {
+        **snapshot,
+        "customers": customers,
+        "warehouse_items": warehouse_items["items"],
+        "warehouse_items_watermark": warehouse_items["watermark"]
+    }
+
+
+def build_user_bootstrap(user):
+    """The per-user part of the snapshot: defaults and company registration"""
+    permissions = resolve_user_permissions(user)
+
+    # Get all registrations created by or assigned to the user
+    company_registration = frappe.db.sql("""
+        SELECT name, organization_name, status, company, industry, country, city,
+            company_status, subscription, days_left
+        FROM `tabCompany Registration`
+        WHERE user_created = %(user)s
+        OR name IN (
+            SELECT reference_name
+            FROM `tabToDo`
+            WHERE reference_type = 'Company Registration'
+                AND allocated_to = %(user)s
+        )
+    """, {"user": user}, as_dict=True)
+
+    return {
+        "warehouse": permissions.get_default("Warehouse"),
+        "cost_center": permissions.get_default("Cost Center"),
+        "default_customer": permissions.get_default("Customer"),
+        "company_registration": company_registration[0] if company_registration else None
+    }
+
+
+def build_warehouse_items(warehouse):
+    """
+    Items and their quantities in a warehouse. The watermark is taken first so a
+    till can delta-sync from this snapshot without missing changes.
+    """
+    watermark = make_watermark()
+    items = []
+    if warehouse:
+        items = frappe.db.sql("""
+            SELECT
+                item.item_code,
+                item.item_name,
+                item.description,
+                item.stock_uom,
+                bin.actual_qty,
+                bin.projected_qty
+            FROM `tabItem` item
+            LEFT JOIN `tabBin` bin ON bin.item_code = item.item_code
+            WHERE bin.warehouse = %s
+        """, warehouse, as_dict=1)
+
+    return {"items": items, "watermark": watermark}
+
+
+def build_customers(cost_center):
+    """Customers with the given cost center"""
+    if not cost_center:
+        return []
+
+    return frappe.get_list("Customer",
+        filters={"custom_cost_center": cost_center},
+        fields=["name", "customer_name", "customer_group", "territory", "custom_cost_center"],
+        ignore_permissions=True
+    )
+
+
+def invalidate_user(user):
+    """Drop the cached bootstrap snapshot of a single user"""
+    if user:
+        frappe.cache().delete_value(BOOTSTRAP_KEY.format(user))
+
+
+def invalidate_warehouse(warehouse):
+    """Drop the shared item list of `warehouse`"""
+    if warehouse:
+        frappe.cache().delete_value(WAREHOUSE_ITEMS_KEY.format(warehouse))
+
+
+def invalidate_cost_center(cost_center):
+    """Drop the shared customer list of `cost_center`"""
+    if cost_center:
+        frappe.cache().delete_value(CUSTOMERS_KEY.format(cost_center))
+
+
+def _count(kind):
+    cache = frappe.cache()
+    try:
+        cache.incr(cache.make_key(STATS_KEY.format(kind)))
+    except Exception:
+        # Counters are diagnostics only, never fail a login over them
+        pass
+
+
+# Doc events
+# ----------
+# Invalidation waits for the commit, otherwise a login in between could cache
+# the rows as they were before this transaction.
+
+def on_user_permission_change(doc, method=None):
+    frappe.db.after_commit.add(lambda: invalidate_user(doc.user))
+
+
+def on_customer_change(doc, method=None):
+    cost_centers = {doc.get("custom_cost_center")}
+    previous = doc.get_doc_before_save() if method != "on_trash" else None
+    if previous:
+        cost_centers.add(previous.get("custom_cost_center"))
+
+    for cost_center in filter(None, cost_centers):
+        frappe.db.after_commit.add(lambda cost_center=cost_center: invalidate_cost_center(cost_center))
+
+
+def invalidate_warehouses_after_commit(warehouses):
+    """
+    Collect warehouses to invalidate in frappe.flags and register a single
+    callback per transaction, so a stock entry with many rows invalidates
+    each warehouse once
+    """
+    pending = frappe.flags.havano_bootstrap_warehouses
+    if pending is None:
+        pending = frappe.flags.havano_bootstrap_warehouses = set()
+        frappe.db.after_commit.add(_flush_warehouse_invalidations)
+        frappe.db.after_rollback.add(_discard_warehouse_invalidations)
+
+    pending.update(filter(None, warehouses))
+
+
+def _flush_warehouse_invalidations():
+    for warehouse in frappe.flags.pop("havano_bootstrap_warehouses", None) or ():
+        invalidate_warehouse(warehouse)
+
+
+def _discard_warehouse_invalidations():
+    frappe.flags.pop("havano_bootstrap_warehouses", None)
+
+
+def on_bin_change(doc, method=None):
+    invalidate_warehouses_after_commit([doc.warehouse])
+
+
+def on_stock_ledger_entry_change(doc, method=None):
+    invalidate_warehouses_after_commit([doc.warehouse])
+
+
+def on_item_change(doc, method=None):
+    invalidate_warehouses_after_commit(frappe.get_all("Bin", filters={"item_code": doc.name}, pluck="warehouse"))
+
+
+def on_company_registration_change(doc, method=None):
+    assigned_users = frappe.get_all("ToDo",
+        filters={"reference_type": "Company Registration", "reference_name": doc.name},
+        pluck="allocated_to"
+    )
+    for user in {doc.user_created, *assigned_users}:
+        frappe.db.after_commit.add(lambda user=user: invalidate_user(user))
+
+
+@frappe.whitelist()
+def get_bootstrap_stats():
+    """
+    Get hit/miss counters of the login bootstrap cache
+
+    Returns:
+        dict: hits, misses and hit ratio
+    """
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    hits = frappe.utils.cint(cache.get(cache.make_key(STATS_KEY.format("hits"))))
+    misses = frappe.utils.cint(cache.get(cache.make_key(STATS_KEY.format("misses"))))
+    total = hits + misses
+
+    return {
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": round(hits / total, 4) if total else 0
+    }
@@ -0,0 +1,153 @@
+import math
+
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+
+from havano_company.apis.user_permissions import resolve_user_permissions
+from havano_company.apis.utils import create_response
+
+AVAILABILITY_CACHE_KEY = "havano_bundle_availability::{0}"
+BUNDLE_VERSION_KEY = "havano_bundle_version::{0}"
+
+
+def get_availability_field(owner):
+    """Field of an owner's availability in a warehouse's hash, tied to the version of their bundles"""
+    cache = frappe.cache()
+    version = cint(cache.get(cache.make_key(BUNDLE_VERSION_KEY.format(owner))))
+    return f"{owner}::{version}"
+
+
+def bump_bundle_version(owner):
+    cache = frappe.cache()
+    return cache.incr(cache.make_key(BUNDLE_VERSION_KEY.format(owner)))
+
+
+def compute_bundle_availability(owner, warehouse):
+    """
+    Compute how many of each Product Bundle can be built from a warehouse's stock.
+
+    Every bundle component is joined to its Bin in one query; a bundle's buildable
+    quantity is the smallest floor(actual_qty / required_qty) over its components.
+
+    Args:
+        owner: Only bundles created by this user, as in get_my_product_bundles
+        warehouse: Warehouse whose stock is used
+
+    Returns:
+        list: Bundles with buildable_qty, the limiting item and per-component stock
+    """
+    rows = frappe.db.sql("""
+        SELECT
+            pb.name AS bundle,
+            pb.new_item_code,
+            pbi.item_code,
+            pbi.qty AS required_qty,
+            COALESCE(bin.actual_qty, 0) AS actual_qty
+        FROM `tabProduct Bundle` pb
+        INNER JOIN `tabProduct Bundle Item` pbi
+            ON pbi.parent = pb.name AND pbi.parenttype = 'Product Bundle'
+        LEFT JOIN `tabBin` bin
+            ON bin.item_code = pbi.item_code AND bin.warehouse = %(warehouse)s
+        WHERE pb.owner = %(owner)s
+        ORDER BY pb.name, pbi.idx
+    """, {"owner": owner, "warehouse": warehouse}, as_dict=True)
+
+    bundles = {}
+    for row in rows:
+        bundle = bundles.setdefault(row.bundle, {
+            "bundle": row.bundle,
+            "new_item_code": row.new_item_code,
+            "buildable_qty": None,
+            "limiting_item": None,
+            "components": []
+        })
+
+        required_qty = flt(row.required_qty)
+        # A component with no quantity does not constrain the bundle
+        buildable = math.floor(max(flt(row.actual_qty), 0) / required_qty) if required_qty > 0 else None
+        bundle["components"].append({
+            "item_code": row.item_code,
+            "required_qty": required_qty,
+            "actual_qty": flt(row.actual_qty),
+            "buildable_qty": buildable
+        })
+
+        if buildable is not None and (bundle["buildable_qty"] is None or buildable < bundle["buildable_qty"]):
+            bundle["buildable_qty"] = buildable
+            bundle["limiting_item"] = row.item_code
+
+    for bundle in bundles.values():
+        bundle["buildable_qty"] = bundle["buildable_qty"] or 0
+
+    return list(bundles.values())
+
+
+@frappe.whitelist()
+def get_bundle_availability(warehouse=None):
+    """
+    Get the buildable quantity of every Product Bundle of the current user
+
+    Args:
+        warehouse: Warehouse to check stock in (optional, defaults to the user's default warehouse)
+
+    Returns:
+        Response with the warehouse and the availability of each bundle
+    """
+    try:
+        user = frappe.session.user
+        if user == "Guest":
+            frappe.throw(_("Please login to view bundle availability"), frappe.PermissionError)
+
+        permissions = resolve_user_permissions(user)
+        if not warehouse:
+            warehouse = permissions.get_default("Warehouse")
+        elif not permissions.is_allowed("Warehouse", warehouse):
+            frappe.throw(_("You do not have access to this warehouse"), frappe.PermissionError)
+
+        if not warehouse:
+            frappe.throw(_("No default warehouse set for this user"))
+
+        cache = frappe.cache()
+        field = get_availability_field(user)
+        availability = cache.hget(AVAILABILITY_CACHE_KEY.format(warehouse), field)
+        if availability is None:
+            availability = compute_bundle_availability(user, warehouse)
+            cache.hset(AVAILABILITY_CACHE_KEY.format(warehouse), field, availability)
+
+        create_response(
+            status=200,
+            message=_("Bundle availability retrieved successfully"),
+            data={
+                "warehouse": warehouse,
+                "bundles": availability
+            }
+        )
+        return
+
+    except frappe.PermissionError as e:
+        create_response(status=403, message=str(e))
+        return
+
+    except Exception as e:
+        frappe.log_error("Bundle Availability Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+# Doc events
+# ----------
+
+def on_stock_change(doc, method=None):
+    """Bin and Stock Ledger Entry changes drop the warehouse's availability once committed"""
+    warehouse = doc.warehouse
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(AVAILABILITY_CACHE_KEY.format(warehouse)))
+
+
+def on_product_bundle_change(doc, method=None, *args):
+    """
+    A bundle's components changed, its owner's availability is stale in every
+    warehouse. Raising the owner's version orphans those fields without a KEYS scan.
+    """
+    owner = doc.owner
+    frappe.db.after_commit.add(lambda: bump_bundle_version(owner))
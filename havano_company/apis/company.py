@@ -1,8 +1,12 @@
 import frappe
 from frappe import _
-from havano_company.apis.utils import create_response
+from frappe.utils import cint, get_datetime
+from havano_company.apis.utils import create_response, decode_cursor, encode_cursor, log_sampled
+from havano_company.apis.user_permissions import add_user_permissions, resolve_user_permissions
+from havano_company.apis.roles import grant_roles
+from havano_company.apis.defaults import get_company_defaults
 import datetime
-import time
+from contextlib import contextmanager
 
 
 @frappe.whitelist(allow_guest=True)
@@ -22,7 +26,7 @@ def register_company(organization_name, full_name=None, email=None, phone=None,
         user_email: User email for guest registration (required if guest)
     
     Returns:
-        dict: Success message with company registration details
+        dict: Job id and token of the background provisioning, see provisioning.get_registration_status
     """
     try:
         # Validate required parameters
@@ -61,6 +65,11 @@ def register_company(organization_name, full_name=None, email=None, phone=None,
         if industry and industry not in valid_industries:
             frappe.throw(_(f"Invalid industry. Must be one of: {', '.join(valid_industries)}"))
         
+        from havano_company.apis.provisioning import enqueue_provisioning, make_provisioning_token
+
+        # Guests follow the provisioning job with this token, only its hash is stored
+        provisioning_token, provisioning_token_hash = make_provisioning_token()
+
         # Create Company Registration document
         company_registration = frappe.get_doc({
             "doctype": "Company Registration",
@@ -73,125 +82,33 @@ def register_company(organization_name, full_name=None, email=None, phone=None,
             "country": country,
             "city": city,
             "status": "Created",
-            "user_created": user
+            "user_created": user,
+            "provisioning_status": "Queued",
+            "provisioning_token_hash": provisioning_token_hash
         })
         
         company_registration.insert(ignore_permissions=True)
         frappe.db.commit()
 
-        submit_company_registration(company_registration)
-        company_registration = frappe.get_doc("Company Registration", company_registration.name)
-        company_registration.company = company_registration.organization_name
-        company_registration.save(ignore_permissions=True)
-        frappe.db.commit()
-
-        warehouse = frappe.get_all(
-            "Warehouse",
-            filters={
-                "company": organization_name,
-                "warehouse_name": ["like", "Stores%"]
-            },
-            fields=["name"],
-            limit=1
-        )
-
-        if warehouse:
-            warehouse_name = warehouse[0]["name"]  # get the string from the list
-            user_permission = frappe.get_doc({
-                "doctype": "User Permission",
-                "user": user_email,
-                "allow": "Warehouse",
-                "for_value": warehouse_name,  # pass the string
-                "apply_to_all_doctypes": 1,
-                "is_default": 1 
-            })
-            user_permission.insert(ignore_permissions=True)
-            frappe.db.commit()
-        else:
-            print("No warehouse found starting with 'Stores'")
-
-                
-        # ----------------------------------------------------------------------
-        all_warehouse = frappe.get_all(
-                "Warehouse",
-                filters={"company": organization_name},
-                fields=["name"]
-            )
-
-        for i in all_warehouse:
-            try:
-               
-                if i["name"] != warehouse[0]['name']:
-                    user_permission = frappe.get_doc({
-                        "doctype": "User Permission",
-                        "user": user_email,
-                        "allow": "Warehouse",
-                        "for_value": i["name"],
-                        "apply_to_all_doctypes": 1,
-                        "is_default": 0
-                    })
-                    user_permission.insert(ignore_permissions=True)
-                    frappe.db.commit()
-            except Exception as e:
-                frappe.log_error(f"Error assigning warehouse permission: {str(e)}")
-        # ----------------------------------------------------------------------
-
-        def_customer=create_customer_default(f"cust-{organization_name}")
-        
-        try:
-            user_permission = frappe.get_doc({
-            "doctype": "User Permission",
-            "user": user_email,
-            "allow": "Customer",
-            "for_value": def_customer["customer_id"],
-            "apply_to_all_doctypes": 1,
-            "is_default": 1 
-            })
-            user_permission.insert(ignore_permissions=True)
-            frappe.db.commit()
+        # Company, roles and permissions are provisioned in the background
+        enqueue_provisioning(company_registration.name)
 
-        except Exception as e:
-            return e
-
-        try:
-            cost_center=default_cost_center(organization_name)
-            user_permission = frappe.get_doc({
-            "doctype": "User Permission",
-            "user": user_email,
-            "allow": "Cost Center",
-            "for_value": cost_center,
-            "apply_to_all_doctypes": 1,
-            "is_default": 1 
-            })
-            user_permission.insert(ignore_permissions=True)
-            frappe.db.commit()
-
-        except Exception as e:
-            return e
-    
-   
-
-                
         create_response(
-            status=201,
-            message=_("Company registered successfully"),
+            status=202,
+            message=_("Company registration accepted"),
             data={
+                "job_id": company_registration.name,
+                "token": provisioning_token,
+                "status_endpoint": "/api/method/havano_company.apis.provisioning.get_registration_status",
                 "company_registration": {
                     "name": company_registration.name,
                     "organization_name": organization_name,
                     "full_name": full_name,
                     "email": email,
-                    "user_created": user,
-                    "defual_warehouse":warehouse,
-                    "default_customer":def_customer
+                    "user_created": user
                 }
             }
         )
-        # -----------------------------------get warehouse
-       
-
-
-            
         return
     
     except Exception as e:
@@ -205,31 +122,13 @@ def register_company(organization_name, full_name=None, email=None, phone=None,
 
 
 
-@frappe.whitelist()
 @frappe.whitelist()
 def default_cost_center(company):
     """
     Returns the first Cost Center for a given company
     whose name starts with 'Main' (case-insensitive).
     """
-    if not company:
-        return None
-
-    # Fetch all cost centers for this company
-    cost_centers = frappe.get_all(
-        "Cost Center",
-        filters={"company": company},
-        fields=["name"],
-    )
-
-    # Find the first one that starts with 'Main'
-    for cc in cost_centers:
-        cc_name = cc["name"]
-        if cc_name.upper().startswith("MAIN"):
-            print(f"-------------------Matched: {cc_name}")
-            return cc_name
-
-    return None
+    return get_company_defaults(company).cost_center
 
 @frappe.whitelist()
 def create_customer_default(
@@ -516,11 +415,10 @@ def assign_user_to_company(user_email, company_name=None):
             frappe.throw(_("You do not have permission to assign users to this company"))
         
         # Check if user permission already exists
-        existing_permission = frappe.db.exists("User Permission", {
-            "user": user_email,
-            "allow": "Company",
-            "for_value": company_name
-        })
+        existing_permission = next((
+            row.name for row in resolve_user_permissions(user_email).get_rows("Company")
+            if row.for_value == company_name
+        ), None)
         
         if existing_permission:
             create_response(
@@ -558,38 +456,12 @@ def assign_user_to_company(user_email, company_name=None):
         return
         
 def clone_user_permissions(user_email):
-    created_perms = []
     try:
-        logged_user = frappe.session.user
-
-        logged_user_perms = frappe.get_all(
-            "User Permission",
-            filters={"user": logged_user},
-            fields=["allow", "for_value", "apply_to_all_doctypes", "is_default"]
-        )
-
-        for perm in logged_user_perms:
-            # Skip duplicates
-            if frappe.db.exists("User Permission", {
-                "user": user_email,
-                "allow": perm["allow"],
-                "for_value": perm["for_value"]
-            }):
-                continue
-
-            new_perm = frappe.get_doc({
-                "doctype": "User Permission",
-                "user": user_email,
-                "allow": perm["allow"],
-                "for_value": perm["for_value"],
-                "apply_to_all_doctypes": perm["apply_to_all_doctypes"],
-                "is_default": 0
-            })
-            new_perm.insert(ignore_permissions=True)
-            created_perms.append(new_perm.name)
-
-        frappe.db.commit()
-        return created_perms
+        # Copies are never defaults, the invited user picks their own
+        return add_user_permissions([
+            (user_email, perm.allow, perm.for_value, 0, perm.apply_to_all_doctypes)
+            for perm in resolve_user_permissions().rows
+        ])
 
     except Exception as e:
         frappe.log_error(str(e), "Clone User Permissions Error")
@@ -652,11 +524,10 @@ def remove_user_from_company(user_email, company_name=None):
             frappe.throw(_("Cannot remove company owner from the company"))
         
         # Find and delete user permission
-        permission_name = frappe.db.get_value("User Permission", {
-            "user": user_email,
-            "allow": "Company",
-            "for_value": company_name
-        }, "name")
+        permission_name = next((
+            row.name for row in resolve_user_permissions(user_email).get_rows("Company")
+            if row.for_value == company_name
+        ), None)
         
         if not permission_name:
             frappe.throw(_("User is not assigned to this company"))
@@ -684,16 +555,26 @@ def remove_user_from_company(user_email, company_name=None):
         return
 
 
+COMPANY_USER_FIELDS = ("email", "full_name", "first_name", "last_name", "username", "enabled",
+                      "user_type", "mobile_no", "phone", "last_login", "user_image")
+DEFAULT_COMPANY_USER_FIELDS = ("email", "full_name", "username", "enabled", "user_type")
+MAX_PAGE_LENGTH = 500
+USER_COMPANIES_CACHE_KEY = "havano_user_companies"
+
+
 @frappe.whitelist()
-def get_company_users(company_name=None):
+def get_company_users(company_name=None, cursor=None, page_length=100, fields=None):
     """
-    Get all users assigned to a company
+    Get users assigned to a company, one page at a time
     
     Args:
         company_name: Company name (optional, defaults to current user's company)
+        cursor: Cursor returned by the previous page (optional)
+        page_length: Number of users per page (optional, max 500)
+        fields: JSON list of User fields to return (optional)
     
     Returns:
-        List of users assigned to the company
+        Page of users assigned to the company, the owner and the next cursor
     """
     try:
         current_user = frappe.session.user
@@ -715,11 +596,7 @@ def get_company_users(company_name=None):
             company_name = company_registration.company
         
         # Check if current user has access to this company
-        has_access = frappe.db.exists("User Permission", {
-            "user": current_user,
-            "allow": "Company",
-            "for_value": company_name
-        }) or frappe.db.exists("Has Role", {
+        has_access = resolve_user_permissions(current_user).is_allowed("Company", company_name) or frappe.db.exists("Has Role", {
             "parent": current_user,
             "role": "System Manager"
         })
@@ -727,36 +604,71 @@ def get_company_users(company_name=None):
         if not has_access:
             frappe.throw(_("You do not have access to this company"))
         
-        # Get all users assigned to the company
-        user_permissions = frappe.get_all(
-            "User Permission",
-            filters={
-                "allow": "Company",
-                "for_value": company_name
-            },
-            fields=["user", "name", "creation", "is_default"],
-            ignore_permissions=True
-        )
-        
-        # Get user details
-        users = []
-        for perm in user_permissions:
-            user_doc = frappe.get_doc("User", perm.user)
-            users.append({
-                "email": user_doc.email,
-                "full_name": user_doc.full_name,
-                "username": user_doc.username,
-                "enabled": user_doc.enabled,
-                "user_type": user_doc.user_type,
-                "permission_name": perm.name,
-                "is_default": perm.is_default,
-                "assigned_on": perm.creation
-            })
+        user_fields = frappe.parse_json(fields) if fields else DEFAULT_COMPANY_USER_FIELDS
+        invalid_fields = set(user_fields) - set(COMPANY_USER_FIELDS)
+        if invalid_fields:
+            frappe.throw(_("Invalid fields: {0}").format(", ".join(invalid_fields)))
+
+        page_length = min(cint(page_length) or 100, MAX_PAGE_LENGTH)
+        values = {"company": company_name, "limit": page_length + 1}
+        cursor_condition = ""
+        if cursor:
+            values["cursor_creation"], values["cursor_name"] = decode_cursor(cursor)
+            cursor_condition = """AND (up.creation > %(cursor_creation)s
+                OR (up.creation = %(cursor_creation)s AND up.name > %(cursor_name)s))"""
+
+        # Users, owner and total come back in one round trip; the company row
+        # drives the query so the owner is returned even when the page is empty
+        rows = frappe.db.sql(f"""
+            SELECT
+                up.name AS permission_name,
+                up.is_default,
+                up.creation AS assigned_on,
+                {", ".join(f"u.`{field}` AS `{field}`" for field in user_fields)},
+                owner.user_created AS owner_user_created,
+                owner.full_name AS owner_full_name,
+                owner.email AS owner_email,
+                (SELECT COUNT(*) FROM `tabUser Permission`
+                    WHERE allow = 'Company' AND for_value = %(company)s) AS total_users
+            FROM (SELECT %(company)s AS company) c
+            LEFT JOIN (
+                SELECT company, user_created, full_name, email
+                FROM `tabCompany Registration`
+                WHERE company = %(company)s
+                ORDER BY creation
+                LIMIT 1
+            ) owner ON owner.company = c.company
+            LEFT JOIN `tabUser Permission` up ON up.allow = 'Company'
+                AND up.for_value = c.company
+                {cursor_condition}
+            LEFT JOIN `tabUser` u ON u.name = up.user
+            ORDER BY up.creation, up.name
+            LIMIT %(limit)s
+        """, values, as_dict=True)
+
+        owner = None
+        if rows and rows[0].owner_user_created:
+            owner = {
+                "user_created": rows[0].owner_user_created,
+                "full_name": rows[0].owner_full_name,
+                "email": rows[0].owner_email
+            }
+        total_users = rows[0].total_users if rows else 0
+
+        users = [
+            {
+                **{field: row[field] for field in user_fields},
+                "permission_name": row.permission_name,
+                "is_default": row.is_default,
+                "assigned_on": row.assigned_on
+            }
+            for row in rows if row.permission_name
+        ]
         
-        # Check if there's a company owner
-        owner = frappe.db.get_value("Company Registration", {
-            "company": company_name
-        }, ["user_created", "full_name", "email"], as_dict=True)
+        next_cursor = None
+        if len(users) > page_length:
+            users = users[:page_length]
+            next_cursor = encode_cursor(users[-1]["assigned_on"], users[-1]["permission_name"])
         
         create_response(
             status=200,
@@ -765,7 +677,8 @@ def get_company_users(company_name=None):
                 "company": company_name,
                 "owner": owner,
                 "users": users,
-                "total_users": len(users)
+                "total_users": total_users,
+                "next_cursor": next_cursor
             }
         )
         return
@@ -809,51 +722,15 @@ def get_user_companies(user_email=None):
             if not has_system_role:
                 frappe.throw(_("You can only view your own company assignments"))
         
-        # Get all company permissions for the user
-        company_permissions = frappe.get_all(
-            "User Permission",
-            filters={
-                "user": user_email,
-                "allow": "Company"
-            },
-            fields=["for_value", "name", "creation", "is_default", "apply_to_all_doctypes"],
-            ignore_permissions=True
-        )
-        
-        # Get company details
-        companies = []
-        for perm in company_permissions:
-            if frappe.db.exists("Company", perm.for_value):
-                company = frappe.db.get_value("Company", perm.for_value, 
-                                             ["name", "company_name", "country", "abbr"], 
-                                             as_dict=True)
-                companies.append({
-                    "company": company.name,
-                    "company_name": company.company_name,
-                    "country": company.country,
-                    "abbr": company.abbr,
-                    "permission_name": perm.name,
-                    "is_default": perm.is_default,
-                    "assigned_on": perm.creation
-                })
-        
-        # Check if user owns any companies
-        owned_companies = frappe.get_all(
-            "Company Registration",
-            filters={"user_created": user_email},
-            fields=["company", "organization_name", "status"],
-            ignore_permissions=True
-        )
+        data = frappe.cache().hget(USER_COMPANIES_CACHE_KEY, user_email)
+        if data is None:
+            data = _load_user_companies(user_email)
+            frappe.cache().hset(USER_COMPANIES_CACHE_KEY, user_email, data)
         
         create_response(
             status=200,
             message=_("User companies retrieved successfully"),
-            data={
-                "user": user_email,
-                "companies": companies,
-                "owned_companies": owned_companies,
-                "total_companies": len(companies)
-            }
+            data=data
         )
         return
         
@@ -866,6 +743,88 @@ def get_user_companies(user_email=None):
         return
 
 
+def _load_user_companies(user):
+    """Assigned and owned companies of a user, in one query"""
+    rows = frappe.db.sql("""
+        SELECT
+            'assigned' AS kind,
+            co.name AS company,
+            co.company_name,
+            co.country,
+            co.abbr,
+            up.name AS permission_name,
+            up.is_default,
+            up.creation AS assigned_on,
+            NULL AS organization_name,
+            NULL AS status
+        FROM `tabUser Permission` up
+        INNER JOIN `tabCompany` co ON co.name = up.for_value
+        WHERE up.user = %(user)s AND up.allow = 'Company'
+        UNION ALL
+        SELECT
+            'owned', cr.company, NULL, NULL, NULL, NULL, NULL, cr.creation,
+            cr.organization_name, cr.status
+        FROM `tabCompany Registration` cr
+        WHERE cr.user_created = %(user)s
+        ORDER BY assigned_on
+    """, {"user": user}, as_dict=True)
+
+    companies = [
+        {
+            "company": row.company,
+            "company_name": row.company_name,
+            "country": row.country,
+            "abbr": row.abbr,
+            "permission_name": row.permission_name,
+            "is_default": row.is_default,
+            "assigned_on": row.assigned_on
+        }
+        for row in rows if row.kind == "assigned"
+    ]
+    owned_companies = [
+        {
+            "company": row.company,
+            "organization_name": row.organization_name,
+            "status": row.status
+        }
+        for row in rows if row.kind == "owned"
+    ]
+
+    return {
+        "user": user,
+        "companies": companies,
+        "owned_companies": owned_companies,
+        "total_companies": len(companies)
+    }
+
+
+def clear_user_companies_cache(user=None):
+    """Drop the cached companies of one user, or of every user"""
+    if user:
+        frappe.cache().hdel(USER_COMPANIES_CACHE_KEY, user)
+    else:
+        frappe.cache().delete_value(USER_COMPANIES_CACHE_KEY)
+
+
+# Invalidation waits for the commit, otherwise a lookup in between could cache
+# the companies as they were before this transaction.
+
+def on_user_permission_change(doc, method=None):
+    if doc.allow == "Company":
+        user = doc.user
+        frappe.db.after_commit.add(lambda: clear_user_companies_cache(user))
+
+
+def on_company_change(doc, method=None, *args):
+    # Any user may be assigned to the company, so every entry goes
+    frappe.db.after_commit.add(clear_user_companies_cache)
+
+
+def on_company_registration_change(doc, method=None):
+    user = doc.user_created
+    frappe.db.after_commit.add(lambda: clear_user_companies_cache(user))
+
+
 def submit_company_registration(company_registration):
     """
     Submit company registration
@@ -875,8 +834,7 @@ def submit_company_registration(company_registration):
         method: Method name
     """
     try:
-        company_abbr = company_registration.organization_name[:3].upper() + company_registration.user_created[:3] + str(time.time())[-4:]
-        create_company(company_registration.organization_name, company_registration.country, company_abbr)
+        create_company(company_registration.organization_name, company_registration.country)
         create_user_permission_for_company(company_registration.user_created, company_registration.organization_name)
 
         create_response(
@@ -929,71 +887,86 @@ def create_user_permission_for_company(user, company):
 		]
 		
 		# Assign all roles to the user
-		assigned_roles = []
-		for role in roles_to_assign:
-			# Check if role exists
-			if frappe.db.exists("Role", role):
-				# Check if user already has this role
-				has_role = frappe.db.exists("Has Role", {
-					"parent": user,
-					"role": role
-				})
-				
-				if not has_role:
-					# Assign role to user
-					frappe.get_doc({
-						"doctype": "Has Role",
-						"parent": user,
-						"parenttype": "User",
-						"parentfield": "roles",
-						"role": role
-					}).insert(ignore_permissions=True)
-					assigned_roles.append(role)
-					frappe.logger().info(f"Assigned {role} role to user {user}")
-			else:
-				frappe.logger().warning(f"Role {role} not found, skipping...")
+		assigned_roles = grant_roles(user, roles_to_assign).assigned
 		
 		frappe.logger().info(f"Successfully assigned {len(assigned_roles)} roles to user {user}: {assigned_roles}")
 		
-		# Check if user permission already exists
-		existing_permission = frappe.db.exists("User Permission", {
-			"user": user,
-			"allow": "Company",
-			"for_value": company
-		})
-		
-		if not existing_permission:
-			# Create user permission
-			user_permission = frappe.get_doc({
-				"doctype": "User Permission",
-				"user": user,
-				"allow": "Company",
-				"for_value": company,
-				"apply_to_all_doctypes": 1,
-				'is_default': 1
-			})
-			user_permission.insert(ignore_permissions=True)
-			frappe.db.commit()
-			
+		# Create user permission unless it already exists
+		if add_user_permissions([(user, "Company", company, 1, 1)]):
 			frappe.logger().info(f"User permission created for user {user} and company {company}")
 		
 	except Exception as e:
 		frappe.log_error("Error creating user permission", f"Failed to create user permission for user {user} and company {company}: {str(e)}\n\n{frappe.get_traceback()}")
-		# Don't throw error to avoid blocking the process
+		# Re-raise so provisioning marks the stage failed and can resume it
+		raise
+
+COMPANY_CREATION_LOCK = "havano_company_creation"
+COMPANY_CREATION_LOCK_TIMEOUT = 900
+
 
-def create_company(company_name, country, company_abbr):
+@contextmanager
+def company_creation_lock():
     """
-    Create a company with retry logic for database deadlocks
-    
+    Hold the Redis lock that serializes Company inserts across all workers
+
+    The lock expires after COMPANY_CREATION_LOCK_TIMEOUT seconds; releasing it
+    after that (or after another worker took it over) is not an error.
+    """
+    from redis.exceptions import LockError
+
+    cache = frappe.cache()
+    lock = cache.lock(
+        cache.make_key(COMPANY_CREATION_LOCK),
+        timeout=COMPANY_CREATION_LOCK_TIMEOUT,
+        blocking_timeout=COMPANY_CREATION_LOCK_TIMEOUT
+    )
+    if not lock.acquire():
+        frappe.throw(_("Company creation is busy. Please try again in a moment."))
+
+    try:
+        yield
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            frappe.logger().warning("Company creation lock expired before it was released")
+
+
+def allocate_company_abbr(company_name):
+    """
+    Allocate a collision-free company abbreviation from a reserved sequence.
+
+    The sequence row is locked until the caller commits, so two allocations
+    never return the same number. Legacy abbreviations are skipped.
+
+    Args:
+        company_name: Name of the company
+
+    Returns:
+        str: Abbreviation like "ACM007"
+    """
+    from frappe.model.naming import getseries
+
+    prefix = "".join(ch for ch in company_name.upper() if ch.isalnum())[:3] or "HVC"
+    while True:
+        abbr = prefix + getseries(f"havano_company_abbr_{prefix}", 3)
+        if not frappe.db.exists("Company", {"abbr": abbr}):
+            return abbr
+
+
+def create_company(company_name, country, company_abbr=None):
+    """
+    Create a company, one at a time across all workers.
+
+    Concurrent Company inserts (chart of accounts, warehouses, cost centers) deadlock
+    each other, so every insert runs under a Redis lock and commits before releasing it.
+
     Args:
         company_name: Name of the company
         country: Country of the company
-        company_abbr: Company abbreviation
+        company_abbr: Company abbreviation (optional, allocated from a sequence if not given)
     """
-    max_retries = 3
-    retry_delay = 1  # seconds
-    
-    for attempt in range(max_retries):
+    with company_creation_lock():
         try:
             company_doc = frappe.get_doc({
                 "doctype": "Company",
@@ -1001,7 +974,7 @@ def create_company(company_name, country, company_abbr):
                 "default_currency": "USD",
                 "country": country or "United States",
                 "enabled": 1,
-                "abbr": company_abbr,
+                "abbr": company_abbr or allocate_company_abbr(company_name),
                 "default_letter_head": None,
                 "is_group": 0,
                 "default_bank_account": None
@@ -1010,31 +983,10 @@ def create_company(company_name, country, company_abbr):
             frappe.db.commit()
             frappe.logger().info(f"Company created successfully: {company_doc.name}")
             return company_doc
-            
-        except frappe.QueryDeadlockError as e:
-            # Rollback the transaction
-            frappe.db.rollback()
-            
-            if attempt < max_retries - 1:
-                # Wait before retrying (exponential backoff)
-                wait_time = retry_delay * (2 ** attempt)
-                frappe.logger().warning(
-                    f"Database deadlock detected while creating company '{company_name}'. "
-                    f"Retrying in {wait_time} seconds... (Attempt {attempt + 1}/{max_retries})"
-                )
-                time.sleep(wait_time)
-            else:
-                # Max retries reached
-                frappe.log_error(
-                    "Company Creation Failed - Deadlock",
-                    f"Failed to create company '{company_name}' after {max_retries} attempts due to deadlock\n\n{frappe.get_traceback()}"
-                )
-                frappe.throw(_("Failed to create company due to database deadlock. Please try again in a moment."))
-                
+
         except Exception as e:
-            # For non-deadlock errors, rollback and throw immediately
             frappe.db.rollback()
-            frappe.log_error("Company Creation Error", f"Error creating company '{company_name}': {str(e)}\n\n{frappe.get_traceback()}")
+            frappe.log_error("Company Creation Error", f"Error creating company '{company_name}': {e!s}\n\n{frappe.get_traceback()}")
             frappe.throw(_("Failed to create company. Please try again."))
 
 
@@ -1089,27 +1041,62 @@ def create_customer(
 
 
 @frappe.whitelist()
-def get_my_product_bundles():
+def get_my_product_bundles(cursor=None, page_length=100, modified_since=None):
+    """
+    Get Product Bundles owned by the current user with their items
+
+    Args:
+        cursor: Cursor returned by the previous page (optional)
+        page_length: Number of bundles per page (optional, max 500)
+        modified_since: Only bundles modified at or after this datetime (optional)
+
+    Returns:
+        list: Bundles with their items, oldest change first. `next_cursor` is set on
+        the response when there are more pages.
+    """
     user = frappe.session.user
-    frappe.log_error(f"User: {user}", "DEBUG get_my_product_bundles")
 
     if user == "Guest":
         return {"error": "You must be logged in"}
 
-    bundles = frappe.get_all(
-        "Product Bundle",
-        filters={"owner": user},
-        fields=["name", "new_item_code", "description", "creation"]
-    )
-
-    for b in bundles:
+    page_length = min(cint(page_length) or 100, MAX_PAGE_LENGTH)
+    values = {"owner": user, "limit": page_length + 1}
+    conditions = ["owner = %(owner)s"]
+    if modified_since:
+        values["modified_since"] = get_datetime(modified_since)
+        conditions.append("modified >= %(modified_since)s")
+    if cursor:
+        values["cursor_modified"], values["cursor_name"] = decode_cursor(cursor)
+        conditions.append("""(modified > %(cursor_modified)s
+            OR (modified = %(cursor_modified)s AND name > %(cursor_name)s))""")
+
+    bundles = frappe.db.sql(f"""
+        SELECT name, new_item_code, description, creation, modified
+        FROM `tabProduct Bundle`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY modified, name
+        LIMIT %(limit)s
+    """, values, as_dict=True)
+
+    next_cursor = None
+    if len(bundles) > page_length:
+        bundles = bundles[:page_length]
+        next_cursor = encode_cursor(bundles[-1].modified, bundles[-1].name)
+
+    items_by_bundle = {}
+    if bundles:
         items = frappe.get_all(
             "Product Bundle Item",
-            filters={"parent": b.name},
-            fields=["item_code", "item_name","qty"]
+            filters={"parenttype": "Product Bundle", "parent": ["in", [b.name for b in bundles]]},
+            fields=["parent", "item_code", "item_name", "qty"],
+            order_by="parent, idx"
         )
-        b["items"] = items
+        for item in items:
+            items_by_bundle.setdefault(item.pop("parent"), []).append(item)
 
-    frappe.log_error(f"Bundles found: {len(bundles)}", "DEBUG get_my_product_bundles")
-    return bundles
+    for b in bundles:
+        b["items"] = items_by_bundle.get(b.name, [])
 
+    log_sampled(f"get_my_product_bundles: {len(bundles)} bundles for {user}")
+    frappe.response["next_cursor"] = next_cursor
+    return bundles
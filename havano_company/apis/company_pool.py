@@ -0,0 +1,227 @@
+import time
+
+import frappe
+from frappe.utils import cint, flt
+
+from havano_company.apis.company import allocate_company_abbr, company_creation_lock, create_company
+
+POOL_PREFIX = "HVPOOL-"
+DEFAULT_POOL_COUNTRY = "United States"
+CLAIM_LATENCY_KEY = "havano_company_pool_claim_latency"
+CLAIM_STATS_KEY = "havano_company_pool_stats::{0}"
+
+# Records ERPNext names "<name> - <company abbr>", renamed with the company's abbr
+POOL_RENAMED_DOCTYPES = (
+    "Account",
+    "Cost Center",
+    "Warehouse",
+    "Department",
+    "Sales Taxes and Charges Template",
+    "Purchase Taxes and Charges Template",
+    "Item Tax Template",
+)
+
+
+def get_pool_config():
+    """
+    Read the warm pool settings from site config
+
+    Example site_config.json entry:
+        "havano_company_pool": {"size": 3, "refill_rate": 2, "countries": {"Zimbabwe": 5}}
+
+    `size` is the target depth for every country without its own entry and for the
+    default country. A size of 0 (the default) disables the pool.
+
+    Returns:
+        frappe._dict: size, refill_rate and target depth per country
+    """
+    conf = frappe._dict(frappe.conf.get("havano_company_pool") or {})
+    size = cint(conf.get("size"))
+
+    countries = conf.get("countries") or {}
+    if isinstance(countries, list):
+        countries = {country: size for country in countries}
+    targets = {DEFAULT_POOL_COUNTRY: size}
+    targets.update({country: cint(depth) for country, depth in countries.items()})
+
+    return frappe._dict({
+        "size": size,
+        "refill_rate": cint(conf.get("refill_rate")) or 1,
+        "targets": {country: depth for country, depth in targets.items() if depth > 0}
+    })
+
+
+def get_pool_depth():
+    """
+    Count unclaimed pool companies per country
+
+    Returns:
+        dict: {country: depth}
+    """
+    rows = frappe.db.sql("""
+        SELECT country, COUNT(*) AS depth
+        FROM `tabCompany`
+        WHERE name LIKE %s
+        GROUP BY country
+    """, f"{POOL_PREFIX}%", as_dict=True)
+
+    return {row.country: row.depth for row in rows}
+
+
+def refill_pool():
+    """Scheduler entry point, queues pool companies for every country below its target"""
+    config = get_pool_config()
+    if not config.targets:
+        return
+
+    depth = get_pool_depth()
+    for country, target in config.targets.items():
+        missing = min(target - depth.get(country, 0), config.refill_rate)
+        for slot in range(max(missing, 0)):
+            frappe.enqueue(
+                "havano_company.apis.company_pool.create_pool_company",
+                queue="long",
+                timeout=1500,
+                job_id=f"havano_company_pool::{country}::{slot}",
+                deduplicate=True,
+                country=country
+            )
+
+
+def create_pool_company(country):
+    """
+    Build one unassigned company (chart of accounts, warehouses, cost centers) for the pool
+
+    Args:
+        country: Country whose chart of accounts the company is built with
+    """
+    company = create_company(f"{POOL_PREFIX}{frappe.generate_hash(length=8).upper()}", country)
+    frappe.logger().info(f"Added {company.name} to the {country} company pool")
+    return company
+
+
+def claim_pooled_company(company_name, country=None):
+    """
+    Atomically claim a pool company and move it to `company_name`.
+
+    Runs under the company creation lock and commits, like create_company. The
+    company gets a fresh abbreviation and its accounts, cost centers, warehouses,
+    departments and tax templates are renamed to it, see move_pool_company.
+
+    Args:
+        company_name: Final company name
+        country: Country of the registration (defaults to the pool's default country)
+
+    Returns:
+        str: Name of the claimed company, or None if the pool for that country is empty
+    """
+    country = country or DEFAULT_POOL_COUNTRY
+    started = time.monotonic()
+
+    with company_creation_lock():
+        pooled = frappe.db.sql("""
+            SELECT name, abbr
+            FROM `tabCompany`
+            WHERE name LIKE %s AND country = %s
+            ORDER BY creation
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """, (f"{POOL_PREFIX}%", country), as_dict=True)
+
+        if not pooled:
+            _count("misses")
+            return None
+
+        try:
+            move_pool_company(pooled[0].name, pooled[0].abbr, company_name, allocate_company_abbr(company_name))
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            raise
+
+    _count("hits")
+    _record_claim_latency(time.monotonic() - started)
+    frappe.logger().info(f"Claimed pool company {pooled[0].name} as {company_name}")
+
+    return company_name
+
+
+def move_pool_company(old_name, old_abbr, new_name, new_abbr):
+    """
+    Rename a pool company, then every record named after its abbreviation
+
+    rename_doc updates links, dynamic links, versions and cached docs. Records are
+    renamed as ERPNext's replace_abbr does, which is not called itself because it
+    is System Manager only, commits per doctype and swallows errors.
+    """
+    frappe.rename_doc("Company", old_name, new_name, force=True, ignore_permissions=True, show_alert=False)
+    frappe.db.set_value("Company", new_name, {"company_name": new_name, "abbr": new_abbr})
+
+    old_suffix = f" - {old_abbr}"
+    for doctype in POOL_RENAMED_DOCTYPES:
+        if not frappe.db.exists("DocType", doctype):
+            continue
+
+        names = frappe.get_all(doctype,
+            filters={"company": new_name, "name": ["like", f"%{old_suffix}"]},
+            pluck="name"
+        )
+        for name in names:
+            frappe.rename_doc(doctype, name, f"{name[:-len(old_suffix)]} - {new_abbr}",
+                force=True, ignore_permissions=True, show_alert=False)
+
+        meta = frappe.get_meta(doctype)
+        if meta.is_tree and meta.has_field("old_parent"):
+            # rename_doc leaves old_parent on the old name, which NestedSet reads as a move on the next save
+            parent_field = meta.nsm_parent_field or frappe.scrub(f"parent {doctype}")
+            frappe.db.sql(f"""
+                UPDATE `tab{doctype}`
+                SET old_parent = `{parent_field}`
+                WHERE company = %s
+            """, new_name)
+
+
+def _count(kind):
+    cache = frappe.cache()
+    try:
+        cache.incr(cache.make_key(CLAIM_STATS_KEY.format(kind)))
+    except Exception:
+        pass
+
+
+def _record_claim_latency(seconds):
+    cache = frappe.cache()
+    try:
+        cache.lpush(CLAIM_LATENCY_KEY, round(seconds * 1000, 2))
+        cache.ltrim(CLAIM_LATENCY_KEY, 0, 99)
+    except Exception:
+        pass
+
+
+@frappe.whitelist()
+def get_pool_metrics():
+    """
+    Get warm pool depth, claim hit/miss counters and claim latency of the last 100 claims
+
+    Returns:
+        dict: Pool metrics
+    """
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    latencies = sorted(flt(value) for value in cache.lrange(CLAIM_LATENCY_KEY, 0, -1) or [])
+    config = get_pool_config()
+
+    return {
+        "depth": get_pool_depth(),
+        "targets": config.targets,
+        "refill_rate": config.refill_rate,
+        "hits": cint(cache.get(cache.make_key(CLAIM_STATS_KEY.format("hits")))),
+        "misses": cint(cache.get(cache.make_key(CLAIM_STATS_KEY.format("misses")))),
+        "claim_latency_ms": {
+            "samples": len(latencies),
+            "avg": round(sum(latencies) / len(latencies), 2) if latencies else 0,
+            "p95": latencies[int(len(latencies) * 0.95) - 1] if latencies else 0,
+            "max": latencies[-1] if latencies else 0
+        }
+    }
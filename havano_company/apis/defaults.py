@@ -0,0 +1,73 @@
+import frappe
+
+COMPANY_DEFAULTS_CACHE_KEY = "havano_company_defaults"
+DEFAULT_CUSTOMER_PREFIX = "cust-"
+
+
+def get_company_defaults(company):
+    """
+    Resolve the default cost center, warehouse and customer of a company, cached per company
+
+    The cost center is the first whose name starts with "Main" and the warehouse the
+    first starting with "Stores", both prefix lookups on the indexed `name` column.
+    The customer is the one created for the company at registration ("cust-<company>").
+
+    Args:
+        company: Company name
+
+    Only complete results are cached: while a company is being provisioned its
+    warehouse, cost center or customer may not be committed yet, and a cached
+    None would outlive that commit.
+
+    Returns:
+        frappe._dict: cost_center, warehouse and customer (None when missing)
+    """
+    if not company:
+        return frappe._dict(cost_center=None, warehouse=None, customer=None)
+
+    cache = frappe.cache()
+    defaults = cache.hget(COMPANY_DEFAULTS_CACHE_KEY, company)
+    if defaults is None:
+        defaults = frappe._dict(
+            cost_center=frappe.db.get_value(
+                "Cost Center", {"company": company, "name": ["like", "Main%"]}, "name", order_by="name asc"
+            ),
+            warehouse=frappe.db.get_value(
+                "Warehouse", {"company": company, "name": ["like", "Stores%"]}, "name", order_by="name asc"
+            ),
+            customer=frappe.db.get_value(
+                "Customer", {"customer_name": f"{DEFAULT_CUSTOMER_PREFIX}{company}"}, "name", order_by="creation asc"
+            )
+        )
+        if all(defaults.values()):
+            cache.hset(COMPANY_DEFAULTS_CACHE_KEY, company, defaults)
+
+    return defaults
+
+
+def clear_company_defaults_cache(*companies):
+    """Drop the cached defaults of the given companies"""
+    for company in filter(None, companies):
+        frappe.cache().hdel(COMPANY_DEFAULTS_CACHE_KEY, company)
+
+
+# Doc events
+# ----------
+# Invalidation waits for the commit, otherwise a lookup in between could cache
+# the defaults as they were before this transaction.
+
+def on_dimension_change(doc, method=None, *args):
+    """Cost Center and Warehouse insert, rename or delete"""
+    company = doc.company
+    frappe.db.after_commit.add(lambda: clear_company_defaults_cache(company))
+
+
+def on_customer_change(doc, method=None, *args):
+    customer_name = doc.customer_name or ""
+    if customer_name.startswith(DEFAULT_CUSTOMER_PREFIX):
+        company = customer_name[len(DEFAULT_CUSTOMER_PREFIX):]
+        frappe.db.after_commit.add(lambda: clear_company_defaults_cache(company))
+
+
+def on_company_rename(doc, method=None, old=None, new=None, merge=False):
+    frappe.db.after_commit.add(lambda: clear_company_defaults_cache(old, new))
@@ -0,0 +1,81 @@
+import frappe
+from frappe.utils import cint, flt, getdate, nowdate
+
+EXCHANGE_RATE_CACHE_KEY = "havano_exchange_rate::{0}::{1}::{2}::{3}::{4}"
+EXCHANGE_RATE_VERSION_KEY = "havano_exchange_rate_version::{0}::{1}"
+DEFAULT_EXCHANGE_RATE_TTL = 300
+MAX_EXCHANGE_RATE_REQUESTS = 200
+
+
+def get_cached_exchange_rate(from_currency, to_currency, transaction_date=None, args=None):
+    """
+    ERPNext's get_exchange_rate behind a shared cache
+
+    Rates are cached per (from, to, date, buying/selling) for `havano_exchange_rate_ttl`
+    seconds (default 300). The key carries the pair's version, so a committed change to a
+    Currency Exchange of the pair stops every cached date from being read.
+
+    Args:
+        from_currency: Currency to convert from
+        to_currency: Currency to convert to
+        transaction_date: Date of the rate (optional, defaults to today)
+        args: "for_buying" or "for_selling" (optional)
+
+    Returns:
+        float: The exchange rate, or None when ERPNext finds none
+    """
+    from erpnext.setup.utils import get_exchange_rate
+
+    if from_currency == to_currency:
+        return 1.0
+
+    transaction_date = str(getdate(transaction_date or nowdate()))
+    cache = frappe.cache()
+    version = cint(cache.get(cache.make_key(EXCHANGE_RATE_VERSION_KEY.format(from_currency, to_currency))))
+    key = EXCHANGE_RATE_CACHE_KEY.format(from_currency, to_currency, version, transaction_date, args or "")
+
+    exchange_rate = cache.get_value(key)
+    if exchange_rate is None:
+        exchange_rate = get_exchange_rate(
+            from_currency=from_currency,
+            to_currency=to_currency,
+            transaction_date=transaction_date,
+            args=args
+        )
+        # A missing rate is not cached, so a newly added Currency Exchange is picked up at once
+        if exchange_rate:
+            ttl = cint(frappe.conf.get("havano_exchange_rate_ttl") or DEFAULT_EXCHANGE_RATE_TTL)
+            cache.set_value(key, flt(exchange_rate), expires_in_sec=ttl)
+
+    return exchange_rate
+
+
+def clear_exchange_rate_cache(from_currency, to_currency):
+    """
+    Invalidate the cached rates of a currency pair, in both directions and for every
+    date, by raising the pair's version; the old entries expire with their TTL
+    """
+    cache = frappe.cache()
+    cache.incr(cache.make_key(EXCHANGE_RATE_VERSION_KEY.format(from_currency, to_currency)))
+    cache.incr(cache.make_key(EXCHANGE_RATE_VERSION_KEY.format(to_currency, from_currency)))
+
+
+# Doc events
+# ----------
+
+def on_currency_exchange_change(doc, method=None, *args):
+    """
+    A Currency Exchange applies from its date onwards, so every cached date of
+    the pair is dropped, including the old pair when the row was edited. Runs
+    after commit, so a read in between cannot cache the old rate again.
+    """
+    pairs = {(doc.from_currency, doc.to_currency)}
+    before = doc.get_doc_before_save()
+    if before:
+        pairs.add((before.from_currency, before.to_currency))
+
+    def clear():
+        for from_currency, to_currency in pairs:
+            clear_exchange_rate_cache(from_currency, to_currency)
+
+    frappe.db.after_commit.add(clear)
@@ -0,0 +1,76 @@
+import hashlib
+
+import frappe
+from frappe import _
+
+
+def get_idempotency_name(idempotency_key, owner=None):
+    """
+    Name of the Idempotency Key row of a client key
+
+    Keys are scoped to the user posting them, so two tills that happen to send the
+    same key never see each other's documents.
+    """
+    owner = owner or frappe.session.user
+    return hashlib.md5(f"{owner}::{idempotency_key}".encode()).hexdigest()
+
+
+def claim_idempotency_key(idempotency_key, reference_doctype):
+    """
+    Reserve a client idempotency key before posting the document it stands for
+
+    The key is inserted as an Idempotency Key row; its unique name makes a
+    concurrent claim of the same key wait for the first one and then fail, so a
+    key can only ever post one document. Call inside the savepoint of the posting,
+    so a failed posting releases the key again.
+
+    Args:
+        idempotency_key: Key sent by the client for this document
+        reference_doctype: DocType the key posts
+
+    Returns:
+        frappe._dict: The earlier reference_doctype and reference_name if the key was
+        already used, otherwise None and the key is now held by this transaction
+    """
+    if not idempotency_key:
+        frappe.throw(_("Idempotency key is required"))
+
+    existing = get_idempotency_reference(idempotency_key)
+    if existing:
+        return existing
+
+    try:
+        frappe.get_doc({
+            "doctype": "Idempotency Key",
+            "idempotency_key": idempotency_key,
+            "reference_doctype": reference_doctype
+        }).insert(ignore_permissions=True, set_name=get_idempotency_name(idempotency_key))
+    except frappe.DuplicateEntryError:
+        # Claimed by a concurrent request that has committed since; a locking read
+        # sees that row even where the transaction's snapshot predates it
+        existing = get_idempotency_reference(idempotency_key, for_update=True)
+        if not existing:
+            frappe.throw(_("Idempotency key {0} could not be claimed, please retry").format(idempotency_key))
+        return existing
+
+    return None
+
+
+def complete_idempotency_key(idempotency_key, reference_name):
+    """Record the document posted for a claimed key"""
+    frappe.db.set_value("Idempotency Key", get_idempotency_name(idempotency_key), "reference_name", reference_name)
+
+
+def get_idempotency_reference(idempotency_key, for_update=False):
+    return frappe.db.get_value("Idempotency Key", get_idempotency_name(idempotency_key),
+        ["reference_doctype", "reference_name"], as_dict=True, for_update=for_update)
+
+
+def rescope_idempotency_keys():
+    """Patch: rename rows named by the bare client key to their per-owner name"""
+    for name, owner, idempotency_key in frappe.get_all("Idempotency Key",
+        fields=["name", "owner", "idempotency_key"], as_list=True
+    ):
+        scoped_name = get_idempotency_name(idempotency_key, owner)
+        if name != scoped_name:
+            frappe.db.sql("UPDATE `tabIdempotency Key` SET name = %s WHERE name = %s", (scoped_name, name))
@@ -0,0 +1,339 @@
+import pickle
+
+import frappe
+from frappe import _
+from frappe.utils import getdate
+
+from havano_company.apis.user_permissions import resolve_user_permissions
+from havano_company.apis.utils import create_response
+
+# Every candidate Item Price per field, see get_price_candidates
+PRICE_INDEX_KEY = "havano_price_candidates::{0}"
+PRICE_INDEX_VERSION_KEY = "havano_price_index_version::{0}"
+LOADED_FIELD = "__loaded__"
+MAX_RESOLVE_PAIRS = 1000
+
+PRICE_FIELDS = [
+    "price_list", "item_code", "item_name", "uom", "customer", "price_list_rate", "currency",
+    "valid_from", "valid_upto"
+]
+
+
+def get_index_field(item_code, uom, customer=None):
+    """Field of an Item Price in its price list's index: "item_code::uom", plus "::customer" for customer prices"""
+    return f"{item_code}::{uom or ''}::{customer}" if customer else f"{item_code}::{uom or ''}"
+
+
+def get_price_index_version(price_list):
+    """Version of a price list's index, raised on every Item Price change"""
+    cache = frappe.cache()
+    return frappe.utils.cint(cache.get(cache.make_key(PRICE_INDEX_VERSION_KEY.format(price_list))))
+
+
+def bump_price_index_version(price_list):
+    cache = frappe.cache()
+    return cache.incr(cache.make_key(PRICE_INDEX_VERSION_KEY.format(price_list)))
+
+
+def get_price_candidates(rows):
+    """
+    Every Item Price of one index field, latest valid_from first
+
+    All of them are kept, as which one applies depends on the date it is read on.
+    """
+    rows = sorted(rows, key=lambda row: (str(row.valid_from or ""), str(row.modified)), reverse=True)
+    return [{fieldname: row[fieldname] for fieldname in PRICE_FIELDS} for row in rows]
+
+
+def pick_price(candidates, date=None):
+    """
+    The price that applies on `date` (default today): valid_from <= date <= valid_upto,
+    an empty date being open-ended, and of those the one valid from the latest date
+
+    Returns:
+        dict: The price, or None if none is valid on that date
+    """
+    date = getdate(date)
+    for price in candidates or []:
+        if price["valid_from"] and getdate(price["valid_from"]) > date:
+            continue
+        if price["valid_upto"] and getdate(price["valid_upto"]) < date:
+            continue
+        return price
+
+    return None
+
+
+def read_price_candidates(price_list):
+    """
+    Every selling Item Price of a price list in one query, as index field -> candidates
+
+    Returns:
+        dict: {field: candidates} as get_price_candidates builds them
+    """
+    rows = frappe.get_all("Item Price",
+        filters={"price_list": price_list, "supplier": ["is", "not set"]},
+        fields=[*PRICE_FIELDS, "modified"]
+    )
+
+    by_field = {}
+    for row in rows:
+        by_field.setdefault(get_index_field(row.item_code, row.uom, row.customer), []).append(row)
+
+    return {field: get_price_candidates(candidates) for field, candidates in by_field.items()}
+
+
+def load_price_index(price_list):
+    """
+    Build the Redis index of a price list from Item Price in one query
+
+    The index is a hash per price list mapping "item_code::uom" (and
+    "item_code::uom::customer" for customer prices) to its Item Prices, so a
+    lookup is a single field read followed by pick_price.
+    """
+    cache = frappe.cache()
+    key = cache.make_key(PRICE_INDEX_KEY.format(price_list))
+    pipe = cache.pipeline()
+    pipe.delete(key)
+    for field, candidates in read_price_candidates(price_list).items():
+        pipe.hset(key, field, pickle.dumps(candidates))
+    pipe.hset(key, LOADED_FIELD, pickle.dumps(True))
+    pipe.execute()
+
+
+def ensure_price_index(price_list):
+    if not frappe.cache().hget(PRICE_INDEX_KEY.format(price_list), LOADED_FIELD):
+        load_price_index(price_list)
+
+
+def get_indexed_prices(price_list, fields, date=None):
+    """
+    Read several fields of a price list's index in one round trip
+
+    Returns:
+        list: The price dict valid on `date` (default today) for each field, or None
+        where no price exists
+    """
+    if not fields:
+        return []
+
+    ensure_price_index(price_list)
+    cache = frappe.cache()
+    values = cache.hmget(cache.make_key(PRICE_INDEX_KEY.format(price_list)), list(fields))
+    return [pick_price(pickle.loads(value), date) if value else None for value in values]
+
+
+def get_price_list_prices(price_list, date=None, use_cache=True):
+    """
+    Every general (not customer specific) price of a price list valid on `date`
+    (default today), read from the index
+
+    Args:
+        price_list: Price List name
+        date: Date the prices must be valid on (optional, defaults to today)
+        use_cache: Read the Redis index; when false Item Price is read directly
+
+    Returns:
+        list: Prices as {item_code, item_name, uom, price_list_rate, currency}
+    """
+    if use_cache:
+        ensure_price_index(price_list)
+        indexed = frappe.cache().hgetall(PRICE_INDEX_KEY.format(price_list))
+        by_field = {frappe.safe_decode(field): candidates for field, candidates in indexed.items()}
+        by_field.pop(LOADED_FIELD, None)
+    else:
+        by_field = read_price_candidates(price_list)
+
+    prices = []
+    for candidates in by_field.values():
+        price = pick_price(candidates, date)
+        if not price or price["customer"]:
+            continue
+        prices.append({
+            "item_code": price["item_code"],
+            "item_name": price["item_name"],
+            "uom": price["uom"],
+            "price_list_rate": price["price_list_rate"],
+            "currency": price["currency"]
+        })
+
+    return sorted(prices, key=lambda price: (price["item_code"], price["uom"] or ""))
+
+
+def refresh_index_field(price_list, item_code, uom, customer=None):
+    """Re-read one (price_list, item_code, uom, customer) key from Item Price into the index"""
+    cache = frappe.cache()
+    key = PRICE_INDEX_KEY.format(price_list)
+    if not cache.hget(key, LOADED_FIELD):
+        # Not built yet, the next lookup loads it in full
+        return
+
+    rows = frappe.get_all("Item Price",
+        filters={
+            "price_list": price_list,
+            "item_code": item_code,
+            "uom": uom or ["is", "not set"],
+            "customer": customer or ["is", "not set"],
+            "supplier": ["is", "not set"]
+        },
+        fields=[*PRICE_FIELDS, "modified"]
+    )
+
+    field = get_index_field(item_code, uom, customer)
+    if rows:
+        cache.hset(key, field, get_price_candidates(rows))
+    else:
+        cache.hdel(key, field)
+
+
+def drop_price_index(price_list):
+    frappe.cache().delete_value(PRICE_INDEX_KEY.format(price_list))
+    bump_price_index_version(price_list)
+
+
+@frappe.whitelist()
+def resolve_prices(pairs, price_list=None):
+    """
+    Resolve the prices of a batch of (item, customer) pairs in one call
+
+    A customer specific Item Price wins over the general one of the same price list,
+    and only prices valid today are used. Customers use their default price list,
+    otherwise `price_list` or the default selling price list; the UOM defaults to the
+    item's stock UOM. Every customer must be within the caller's User Permissions.
+
+    Args:
+        pairs: JSON list of {item_code, customer, uom (optional), price_list (optional)}
+        price_list: Price list for pairs without a customer price list (optional)
+
+    Returns:
+        Response with one price per pair, in order, and the version of each price list used
+    """
+    try:
+        pairs = frappe.parse_json(pairs) or []
+        if len(pairs) > MAX_RESOLVE_PAIRS:
+            frappe.throw(_("At most {0} pairs can be resolved at once").format(MAX_RESOLVE_PAIRS))
+
+        customers = {pair.get("customer") for pair in pairs} - {None, ""}
+        customer_rows = frappe.get_all("Customer",
+            filters={"name": ["in", list(customers)]},
+            fields=["name", "default_price_list", "custom_cost_center"]
+        ) if customers else []
+        check_customer_access(customers, customer_rows)
+        customer_price_lists = {row.name: row.default_price_list for row in customer_rows}
+
+        item_codes = {pair.get("item_code") for pair in pairs} - {None, ""}
+        stock_uoms = dict(frappe.get_all("Item",
+            filters={"name": ["in", list(item_codes)]},
+            fields=["name", "stock_uom"],
+            as_list=True
+        )) if item_codes else {}
+
+        fallback_price_list = price_list or frappe.db.get_single_value("Selling Settings", "selling_price_list")
+
+        # Group the lookups per price list so each list is read in one round trip
+        lookups = []
+        fields_by_price_list = {}
+        for pair in pairs:
+            item_code = pair.get("item_code")
+            customer = pair.get("customer")
+            uom = pair.get("uom") or stock_uoms.get(item_code)
+            pair_price_list = pair.get("price_list") or customer_price_lists.get(customer) or fallback_price_list
+
+            # Most specific first; an Item Price without a UOM applies to every UOM
+            fields = [get_index_field(item_code, uom), get_index_field(item_code, None)]
+            if customer:
+                fields = [get_index_field(item_code, uom, customer), get_index_field(item_code, None, customer), *fields]
+            fields_by_price_list.setdefault(pair_price_list, set()).update(fields)
+            lookups.append((pair, pair_price_list, uom, fields))
+
+        resolved = {}
+        for pair_price_list, fields in fields_by_price_list.items():
+            if not pair_price_list:
+                continue
+            fields = list(fields)
+            for field, price in zip(fields, get_indexed_prices(pair_price_list, fields), strict=True):
+                resolved[(pair_price_list, field)] = price
+
+        prices = []
+        for pair, pair_price_list, uom, fields in lookups:
+            price = next(filter(None, (resolved.get((pair_price_list, field)) for field in fields)), None)
+            prices.append({
+                "item_code": pair.get("item_code"),
+                "customer": pair.get("customer"),
+                "uom": uom,
+                "price_list": pair_price_list,
+                "price_list_rate": price["price_list_rate"] if price else None,
+                "currency": price["currency"] if price else None,
+                "customer_specific": bool(price and price["customer"])
+            })
+
+        create_response(
+            status=200,
+            message=_("Prices resolved successfully"),
+            data={
+                "prices": prices,
+                "versions": {
+                    name: get_price_index_version(name) for name in fields_by_price_list if name
+                }
+            }
+        )
+        return
+
+    except frappe.PermissionError as e:
+        create_response(status=403, message=str(e))
+        return
+
+    except Exception as e:
+        frappe.log_error("Resolve Prices Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+def check_customer_access(customers, customer_rows):
+    """
+    Throw unless the caller may see every customer, through a Customer permission or
+    a Cost Center permission matching the customer's cost center. As elsewhere, no
+    permissions of a doctype means unrestricted on it.
+    """
+    permissions = resolve_user_permissions()
+    allowed_customers = permissions.get_allowed("Customer")
+    allowed_cost_centers = permissions.get_allowed("Cost Center")
+
+    found = {row.name: row for row in customer_rows}
+    for customer in customers:
+        row = found.get(customer)
+        if (
+            not row
+            or (allowed_customers and customer not in allowed_customers)
+            or (allowed_cost_centers and row.custom_cost_center not in allowed_cost_centers)
+        ):
+            frappe.throw(_("You do not have access to customer {0}").format(customer), frappe.PermissionError)
+
+
+# Doc events
+# ----------
+
+def on_item_price_change(doc, method=None, *args):
+    """
+    Re-index the changed key, and the old one if the price moved, then raise the
+    version. Runs after commit so the index never shows a rolled back price.
+    """
+    keys = {(doc.price_list, doc.item_code, doc.uom, doc.customer)}
+    before = doc.get_doc_before_save()
+    if before:
+        keys.add((before.price_list, before.item_code, before.uom, before.customer))
+
+    def update_index():
+        for price_list, item_code, uom, customer in keys:
+            refresh_index_field(price_list, item_code, uom, customer)
+
+        for price_list in {key[0] for key in keys}:
+            bump_price_index_version(price_list)
+
+    frappe.db.after_commit.add(update_index)
+
+
+def on_price_list_change(doc, method=None, old=None, new=None, merge=False):
+    """Price List deleted or renamed, its index is rebuilt on next use"""
+    for price_list in filter(None, {doc.name, old, new}):
+        drop_price_index(price_list)
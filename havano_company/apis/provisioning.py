@@ -0,0 +1,305 @@
+import hashlib
+import hmac
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, get_datetime, now_datetime
+
+from havano_company.apis.company import (
+    create_company,
+    create_customer_default,
+    create_user_permission_for_company,
+)
+from havano_company.apis.company_pool import claim_pooled_company
+from havano_company.apis.defaults import DEFAULT_CUSTOMER_PREFIX, get_company_defaults
+from havano_company.apis.user_permissions import add_user_permissions
+from havano_company.apis.utils import create_response
+
+PROVISIONING_JOB_TIMEOUT = 1500
+
+
+def enqueue_provisioning(registration):
+    """
+    Queue the provisioning pipeline of a Company Registration
+
+    Args:
+        registration: Company Registration name, also used as the job id
+    """
+    frappe.enqueue(
+        "havano_company.apis.provisioning.run_provisioning",
+        queue="long",
+        timeout=PROVISIONING_JOB_TIMEOUT,
+        job_id=f"havano_provisioning::{registration}",
+        deduplicate=True,
+        registration=registration
+    )
+
+
+def run_provisioning(registration):
+    """
+    Background job running every provisioning stage of a Company Registration in order.
+
+    Each stage commits on success, so a failed run resumes from the stage that failed.
+
+    Args:
+        registration: Company Registration name
+    """
+    doc = frappe.get_doc("Company Registration", registration)
+    stage_names = [name for name, _stage in PROVISIONING_STAGES]
+
+    start = 0
+    if doc.provisioning_status != "Completed" and doc.provisioning_stage in stage_names:
+        start = stage_names.index(doc.provisioning_stage)
+
+    for stage_name, stage in PROVISIONING_STAGES[start:]:
+        _set_progress(registration, "Running", stage_name)
+        try:
+            stage(doc)
+            frappe.db.commit()
+        except Exception as e:
+            frappe.db.rollback()
+            _set_progress(registration, "Failed", stage_name, str(e))
+            frappe.log_error("Company Provisioning Error", frappe.get_traceback())
+            return
+
+    _set_progress(registration, "Completed", None)
+
+
+def _set_progress(registration, status, stage, error=None):
+    frappe.db.set_value("Company Registration", registration, {
+        "provisioning_status": status,
+        "provisioning_stage": stage,
+        "provisioning_error": error,
+        "provisioning_heartbeat": now_datetime()
+    }, update_modified=False)
+    frappe.db.commit()
+
+
+def is_stale(registration):
+    """
+    Whether a Queued or Running registration has outlived its job, e.g. because the
+    worker died or RQ killed the job on timeout, which leaves no chance to mark it Failed
+    """
+    if registration.provisioning_status not in ("Queued", "Running"):
+        return False
+
+    heartbeat = registration.provisioning_heartbeat
+    return not heartbeat or get_datetime(heartbeat) < add_to_date(now_datetime(), seconds=-PROVISIONING_JOB_TIMEOUT)
+
+
+# Stages
+# ------
+# Every stage must be safe to run again after a partial failure.
+
+def _create_company_stage(doc):
+    registered_company = frappe.db.get_value("Company Registration", doc.name, "company")
+    if frappe.db.exists("Company", doc.organization_name):
+        # Only a company this registration created or claimed on an earlier run is
+        # reused; any other company of that name belongs to another tenant
+        if registered_company == doc.organization_name:
+            return
+        frappe.throw(_("Company name {0} is already taken").format(doc.organization_name), frappe.DuplicateEntryError)
+
+    # Recorded in the same transaction as the company, so the ownership marker
+    # is committed exactly when the company is
+    frappe.db.set_value("Company Registration", doc.name, "company", doc.organization_name, update_modified=False)
+
+    # A pre-built company from the warm pool skips the chart of accounts setup
+    if claim_pooled_company(doc.organization_name, doc.country):
+        return
+
+    create_company(doc.organization_name, doc.country)
+
+
+def _assign_roles_stage(doc):
+    create_user_permission_for_company(doc.user_created, doc.organization_name)
+
+
+def _warehouse_permissions_stage(doc):
+    warehouses = frappe.get_all("Warehouse", filters={"company": doc.organization_name}, pluck="name")
+    default_warehouse = get_company_defaults(doc.organization_name).warehouse
+    if not default_warehouse:
+        frappe.logger().warning(f"No warehouse found starting with 'Stores' for {doc.organization_name}")
+
+    add_user_permissions([
+        (doc.user_created, "Warehouse", warehouse, warehouse == default_warehouse, 1)
+        for warehouse in warehouses
+    ])
+
+
+def _default_customer_stage(doc):
+    customer = get_company_defaults(doc.organization_name).customer
+    if not customer:
+        customer = create_customer_default(f"{DEFAULT_CUSTOMER_PREFIX}{doc.organization_name}")["customer_id"]
+
+    add_user_permissions([(doc.user_created, "Customer", customer, 1, 1)])
+
+
+def _cost_center_permission_stage(doc):
+    cost_center = get_company_defaults(doc.organization_name).cost_center
+    if not cost_center:
+        frappe.throw(_("No main cost center found for {0}").format(doc.organization_name))
+
+    add_user_permissions([(doc.user_created, "Cost Center", cost_center, 1, 1)])
+
+
+PROVISIONING_STAGES = (
+    ("create_company", _create_company_stage),
+    ("assign_roles", _assign_roles_stage),
+    ("warehouse_permissions", _warehouse_permissions_stage),
+    ("default_customer", _default_customer_stage),
+    ("cost_center_permission", _cost_center_permission_stage),
+)
+
+
+def get_stage_progress(doc):
+    """
+    Expand the stored status and stage of a registration into per-stage progress
+
+    Args:
+        doc: Company Registration document or dict
+
+    Returns:
+        list: {"stage", "status"} for every stage, status being pending, queued, running, completed or failed
+    """
+    stage_names = [name for name, _stage in PROVISIONING_STAGES]
+    status = doc.get("provisioning_status")
+
+    # Registrations made before the pipeline existed were provisioned inline
+    if status == "Completed" or (not status and doc.get("company")):
+        return [{"stage": name, "status": "completed"} for name in stage_names]
+
+    current = stage_names.index(doc.provisioning_stage) if doc.get("provisioning_stage") in stage_names else 0
+    progress = []
+    for idx, name in enumerate(stage_names):
+        if idx < current:
+            stage_status = "completed"
+        elif idx == current and status:
+            stage_status = status.lower()
+        else:
+            stage_status = "pending"
+        progress.append({"stage": name, "status": stage_status})
+
+    return progress
+
+
+def make_provisioning_token():
+    """
+    Token a guest uses to follow their registration job
+
+    Returns:
+        tuple: (token, hash); only the hash is stored on the registration
+    """
+    token = frappe.generate_hash(length=32)
+    return token, hash_provisioning_token(token)
+
+
+def hash_provisioning_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _get_registration_for_caller(job_id, token=None):
+    registration = frappe.db.get_value(
+        "Company Registration",
+        job_id,
+        ["name", "organization_name", "user_created", "company", "provisioning_token_hash",
+         "provisioning_status", "provisioning_stage", "provisioning_error", "provisioning_heartbeat"],
+        as_dict=True
+    )
+
+    user = frappe.session.user
+    if user == "Guest":
+        # Job ids are sequential, so a guest must hold the token returned by register_company
+        allowed = bool(
+            registration
+            and token
+            and registration.provisioning_token_hash
+            and hmac.compare_digest(registration.provisioning_token_hash, hash_provisioning_token(token))
+        )
+    else:
+        allowed = bool(registration) and (
+            registration.user_created == user or "System Manager" in frappe.get_roles()
+        )
+
+    if not allowed:
+        # Unknown and forbidden jobs look the same, so job ids cannot be probed
+        frappe.throw(_("Registration job not found"), frappe.DoesNotExistError)
+
+    return registration
+
+
+@frappe.whitelist(allow_guest=True)
+def get_registration_status(job_id, token=None):
+    """
+    Get provisioning progress of a company registration
+
+    Args:
+        job_id: Job id returned by register_company
+        token: Token returned by register_company (required if guest)
+
+    Returns:
+        Response with the overall status and the status of each stage
+    """
+    try:
+        registration = _get_registration_for_caller(job_id, token)
+
+        create_response(
+            status=200,
+            message=_("Registration status retrieved successfully"),
+            data={
+                "job_id": registration.name,
+                "organization_name": registration.organization_name,
+                "company": registration.company,
+                "status": registration.provisioning_status or ("Completed" if registration.company else "Queued"),
+                "error": registration.provisioning_error,
+                "stages": get_stage_progress(registration)
+            }
+        )
+        return
+
+    except Exception as e:
+        create_response(
+            status=400,
+            message=str(e)
+        )
+        return
+
+
+@frappe.whitelist(allow_guest=True)
+def resume_registration(job_id, token=None):
+    """
+    Re-queue a failed or stalled registration from the stage it stopped at
+
+    Args:
+        job_id: Job id returned by register_company
+        token: Token returned by register_company (required if guest)
+
+    Returns:
+        Response with the stage provisioning resumes from
+    """
+    try:
+        registration = _get_registration_for_caller(job_id, token)
+
+        if registration.provisioning_status != "Failed" and not is_stale(registration):
+            frappe.throw(_("Only failed or stalled registrations can be resumed"))
+
+        _set_progress(registration.name, "Queued", registration.provisioning_stage)
+        enqueue_provisioning(registration.name)
+
+        create_response(
+            status=202,
+            message=_("Registration resumed"),
+            data={
+                "job_id": registration.name,
+                "resume_from": registration.provisioning_stage
+            }
+        )
+        return
+
+    except Exception as e:
+        frappe.log_error("Resume Registration Error", frappe.get_traceback())
+        create_response(
+            status=400,
+            message=str(e)
+        )
+        return
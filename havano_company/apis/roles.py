@@ -0,0 +1,114 @@
+import frappe
+from frappe import _
+from frappe.utils import now
+
+from havano_company.apis.utils import create_response
+
+
+def grant_roles(user, roles):
+    """
+    Grant roles to a user in bulk.
+
+    Checks which roles exist and which the user already holds in two queries,
+    inserts the missing Has Role rows in one statement and clears the user's
+    cache once. The bulk insert bypasses User.save, so a Website User granted a
+    desk role is promoted to System User here, as User.set_system_user would.
+
+    Args:
+        user: User name (email)
+        roles: Role names, unknown roles are skipped
+
+    Returns:
+        frappe._dict: `assigned` (newly granted) and `skipped` (unknown) roles
+    """
+    roles = list(dict.fromkeys(roles))
+    if not roles:
+        return frappe._dict(assigned=[], skipped=[])
+
+    desk_access = dict(frappe.get_all("Role",
+        filters={"name": ["in", roles]},
+        fields=["name", "desk_access"],
+        as_list=True
+    ))
+    existing_roles = set(desk_access)
+    held_roles = frappe.get_all("Has Role",
+        filters={"parent": user, "parenttype": "User", "parentfield": "roles"},
+        fields=["role", "idx"],
+        ignore_permissions=True
+    )
+
+    held = {row.role for row in held_roles}
+    assigned = [role for role in roles if role in existing_roles and role not in held]
+    skipped = [role for role in roles if role not in existing_roles]
+
+    if assigned:
+        timestamp = now()
+        owner = frappe.session.user
+        next_idx = max((row.idx or 0 for row in held_roles), default=0) + 1
+
+        frappe.db.bulk_insert(
+            "Has Role",
+            fields=["name", "creation", "modified", "owner", "modified_by",
+                    "parent", "parenttype", "parentfield", "idx", "role"],
+            values=[
+                (frappe.generate_hash(length=10), timestamp, timestamp, owner, owner,
+                 user, "User", "roles", next_idx + offset, role)
+                for offset, role in enumerate(assigned)
+            ]
+        )
+        if any(desk_access[role] for role in assigned):
+            promote_to_system_user(user)
+        frappe.clear_cache(user=user)
+
+    if skipped:
+        frappe.logger().warning(f"Roles {skipped} not found, skipped for user {user}")
+
+    return frappe._dict(assigned=assigned, skipped=skipped)
+
+
+def promote_to_system_user(user):
+    """Make a Website User a System User; custom (non-standard) user types are left alone"""
+    if frappe.db.get_value("User", user, "user_type") == "Website User":
+        frappe.db.set_value("User", user, "user_type", "System User")
+
+
+@frappe.whitelist()
+def assign_roles(user, roles):
+    """
+    Admin endpoint to grant several roles to a user at once
+
+    Args:
+        user: User name (email)
+        roles: JSON list of role names
+
+    Returns:
+        Response with the roles granted and the roles skipped because they do not exist
+    """
+    try:
+        frappe.only_for("System Manager")
+
+        if not frappe.db.exists("User", user):
+            frappe.throw(_("User not found"))
+
+        result = grant_roles(user, frappe.parse_json(roles) or [])
+        frappe.db.commit()
+
+        create_response(
+            status=200,
+            message=_("Roles assigned successfully"),
+            data={
+                "user": user,
+                "assigned": result.assigned,
+                "skipped": result.skipped
+            }
+        )
+        return
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error("Assign Roles Error", frappe.get_traceback())
+        create_response(
+            status=400,
+            message=str(e)
+        )
+        return
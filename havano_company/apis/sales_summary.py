@@ -0,0 +1,130 @@
+import hashlib
+
+import frappe
+from frappe import _
+from frappe.utils import flt, getdate, now
+
+from havano_company.apis.utils import create_response
+
+
+def get_summary_name(user, company, posting_date):
+    """Deterministic name of the User Sales Summary row of a user, company and day"""
+    return hashlib.md5(f"{user}::{company}::{getdate(posting_date)}".encode()).hexdigest()
+
+
+def apply_invoice(doc, sign):
+    """
+    Add (sign=1) or remove (sign=-1) a submitted Sales Invoice from its owner's daily total
+
+    The row is upserted in one statement, so concurrent submits for the same
+    user and day add up instead of overwriting each other.
+    """
+    timestamp = now()
+    frappe.db.sql("""
+        INSERT INTO `tabUser Sales Summary`
+            (name, creation, modified, owner, modified_by,
+             user, company, posting_date, total_sales, total_invoices)
+        VALUES
+            (%(name)s, %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator',
+             %(user)s, %(company)s, %(posting_date)s, %(total_sales)s, %(total_invoices)s)
+        ON DUPLICATE KEY UPDATE
+            total_sales = total_sales + VALUES(total_sales),
+            total_invoices = total_invoices + VALUES(total_invoices),
+            modified = VALUES(modified)
+    """, {
+        "name": get_summary_name(doc.owner, doc.company, doc.posting_date),
+        "timestamp": timestamp,
+        "user": doc.owner,
+        "company": doc.company,
+        "posting_date": getdate(doc.posting_date),
+        "total_sales": sign * flt(doc.grand_total),
+        "total_invoices": sign
+    })
+
+
+def rebuild_sales_summary(user=None):
+    """
+    Recompute User Sales Summary from submitted Sales Invoices
+
+    Args:
+        user: Only rebuild this user's rows (optional, defaults to every user)
+    """
+    values = {"user": user, "timestamp": now()}
+    frappe.db.delete("User Sales Summary", {"user": user} if user else None)
+    frappe.db.sql(f"""
+        INSERT INTO `tabUser Sales Summary`
+            (name, creation, modified, owner, modified_by,
+             user, company, posting_date, total_sales, total_invoices)
+        SELECT
+            MD5(CONCAT_WS('::', owner, company, posting_date)), %(timestamp)s, %(timestamp)s,
+            'Administrator', 'Administrator',
+            owner, company, posting_date, SUM(grand_total), COUNT(*)
+        FROM `tabSales Invoice`
+        WHERE docstatus = 1 {"AND owner = %(user)s" if user else ""}
+        GROUP BY owner, company, posting_date
+    """, values)
+
+
+def get_user_sales_totals(from_date=None, to_date=None):
+    """
+    Total sales and invoice count per user, read from the daily rollup
+
+    Returns:
+        dict: {user: frappe._dict(total_sales, total_invoices)}
+    """
+    conditions = []
+    if from_date:
+        conditions.append("posting_date >= %(from_date)s")
+    if to_date:
+        conditions.append("posting_date <= %(to_date)s")
+
+    rows = frappe.db.sql(f"""
+        SELECT user, SUM(total_sales) AS total_sales, SUM(total_invoices) AS total_invoices
+        FROM `tabUser Sales Summary`
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        GROUP BY user
+    """, {"from_date": from_date, "to_date": to_date}, as_dict=True)
+
+    return {row.user: row for row in rows}
+
+
+@frappe.whitelist()
+def rebuild_user_sales_summary(user=None):
+    """
+    Admin endpoint to rebuild the sales rollup from Sales Invoices
+
+    Args:
+        user: Only rebuild this user (optional)
+
+    Returns:
+        Response confirming the rebuild
+    """
+    try:
+        frappe.only_for("System Manager")
+
+        rebuild_sales_summary(user)
+        frappe.db.commit()
+
+        create_response(
+            status=200,
+            message=_("User sales summary rebuilt successfully"),
+            data={"user": user}
+        )
+        return
+
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error("Sales Summary Rebuild Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+# Doc events
+# ----------
+
+def on_sales_invoice_submit(doc, method=None):
+    apply_invoice(doc, 1)
+
+
+def on_sales_invoice_cancel(doc, method=None):
+    apply_invoice(doc, -1)
@@ -4,6 +4,8 @@ from frappe.utils import validate_email_address
 import re
 import random
 from havano_company.apis.utils import create_response
+from havano_company.apis.user_permissions import resolve_user_permissions
+from havano_company.apis.roles import grant_roles
 
 
 @frappe.whitelist(allow_guest=True)
@@ -78,7 +80,7 @@ def signup(email, password, first_name, last_name=None, full_name=None,pin=None,
         user.insert()
         
         # Add default role (customize based on your requirements)
-        user.add_roles("Desk User")  # Change to appropriate role
+        grant_roles(user.name, ["Desk User"])  # Change to appropriate role
         
         frappe.db.commit()
         
@@ -201,10 +203,9 @@ def get_users():
             }
 
         # Get current user's company from User Permission
-        current_user_company = frappe.db.get_value(
-            "User Permission",
-            {"user": frappe.session.user, "allow": "Company"},
-            "for_value"
+        permissions = resolve_user_permissions()
+        current_user_company = permissions.get_default("Company") or next(
+            iter(permissions.get_allowed("Company")), None
         )
 
         if not current_user_company:
@@ -0,0 +1,377 @@
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+from havano_company.apis.user_permissions import resolve_user_permissions
+from havano_company.apis.utils import create_response
+
+QUEUE_KEY = "havano_submission_queue::{0}"
+PROCESSING_KEY = "havano_submission_processing::{0}"
+COMPANIES_KEY = "havano_submission_queue_companies"
+RETRY_KEY = "havano_submission_retries"
+FAILED_KEY = "havano_submission_failed"
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 5
+BASE_BACKOFF_SECONDS = 30
+MAX_BACKOFF_SECONDS = 30 * 60
+
+
+def get_queue_entry(doctype, name):
+    return f"{doctype}::{name}"
+
+
+def parse_queue_entry(entry):
+    return frappe.safe_decode(entry).split("::", 1)
+
+
+def get_job_id(company):
+    return f"havano_submission::{company}"
+
+
+def auto_submit_enabled(company):
+    """
+    Whether POS documents of `company` are submitted as soon as they are inserted
+
+    Off unless site config opts in, so ERPNext's draft and hold flows keep working:
+        "havano_auto_submit_pos": 1                      every company
+        "havano_auto_submit_pos": ["Company A", ...]     only these companies
+    """
+    setting = frappe.conf.get("havano_auto_submit_pos")
+    if isinstance(setting, list | tuple):
+        return company in setting
+    return bool(cint(setting))
+
+
+def auto_submit(doc):
+    """after_insert handler body: submit or defer a POS document if its company opted in"""
+    if auto_submit_enabled(doc.company):
+        submit_or_defer(doc)
+
+
+def get_worker_queue():
+    """RQ queue the submissions run on; point `havano_submission_queue` at a dedicated worker"""
+    return frappe.conf.get("havano_submission_queue") or "long"
+
+
+def submit_or_defer(doc):
+    """
+    Submit now, or queue the submission when `havano_defer_pos_submission` is set
+
+    Safe to call twice for the same document, e.g. from an after_insert hook and
+    then from the endpoint that inserted it.
+    """
+    if doc.docstatus != 0 or doc.flags.havano_submission_handled:
+        # Inserted as submitted (e.g. saved and submitted in one go from the POS),
+        # or already submitted or queued
+        return
+
+    doc.flags.havano_submission_handled = True
+    if cint(frappe.conf.get("havano_defer_pos_submission")):
+        defer_submission(doc)
+    else:
+        doc.submit()
+
+
+def defer_submission(doc):
+    """
+    Queue a saved draft for submission in the background
+
+    The document is pushed on its company's queue once the insert commits, and
+    one deduplicated job per company drains the queue in batches.
+    """
+    entry = get_queue_entry(doc.doctype, doc.name)
+    company = doc.company
+
+    def push():
+        cache = frappe.cache()
+        cache.rpush(QUEUE_KEY.format(company), entry)
+        cache.sadd(COMPANIES_KEY, company)
+        enqueue_company(company)
+
+    frappe.db.after_commit.add(push)
+
+
+def enqueue_company(company):
+    frappe.enqueue(
+        "havano_company.apis.submission_queue.process_company_queue",
+        queue=get_worker_queue(),
+        job_id=get_job_id(company),
+        deduplicate=True,
+        company=company
+    )
+
+
+def process_company_queue(company):
+    """
+    Submit a company's queued documents, BATCH_SIZE at a time, until the queue is empty
+
+    Entries move atomically to the company's processing list and leave it only once
+    their submission committed or was scheduled for retry, so a worker that dies
+    mid-batch loses nothing: requeue_due_retries puts the leftovers back. Each
+    document is submitted as its owner and committed on its own, so one failure
+    does not hold back the rest; failures go to the retry schedule.
+    """
+    cache = frappe.cache()
+    queue = cache.make_key(QUEUE_KEY.format(company))
+    processing = cache.make_key(PROCESSING_KEY.format(company))
+    session_user = frappe.session.user
+
+    try:
+        while True:
+            batch = []
+            for _i in range(BATCH_SIZE):
+                entry = cache.lmove(queue, processing, "LEFT", "RIGHT")
+                if not entry:
+                    break
+                batch.append(entry)
+            if not batch:
+                break
+
+            for entry in batch:
+                doctype, name = parse_queue_entry(entry)
+                submit_queued_document(doctype, name, company)
+                cache.lrem(processing, 1, entry)
+    finally:
+        frappe.set_user(session_user)
+
+
+def submit_queued_document(doctype, name, company):
+    entry = get_queue_entry(doctype, name)
+    try:
+        doc = frappe.get_doc(doctype, name)
+        if doc.docstatus == 0:
+            frappe.set_user(doc.owner)
+            doc.submit()
+            frappe.db.commit()
+        frappe.cache().hdel(RETRY_KEY, entry)
+    except frappe.DoesNotExistError:
+        # Deleted while queued, nothing left to submit
+        frappe.db.rollback()
+        frappe.cache().hdel(RETRY_KEY, entry)
+    except Exception as e:
+        frappe.db.rollback()
+        schedule_retry(doctype, name, company, str(e))
+
+
+def requeue_orphaned_entries(company):
+    """
+    Put entries left on a company's processing list by a dead job back at the head
+    of its queue
+
+    Returns:
+        int: Number of entries requeued
+    """
+    from frappe.utils.background_jobs import is_job_enqueued
+
+    if is_job_enqueued(get_job_id(company)):
+        # A live job owns the processing list
+        return 0
+
+    cache = frappe.cache()
+    queue = cache.make_key(QUEUE_KEY.format(company))
+    processing = cache.make_key(PROCESSING_KEY.format(company))
+    requeued = 0
+    while cache.lmove(processing, queue, "RIGHT", "LEFT"):
+        requeued += 1
+
+    return requeued
+
+
+def is_enqueued(doctype, name, company):
+    """Whether a document is waiting on its company's queue or being processed"""
+    cache = frappe.cache()
+    entry = get_queue_entry(doctype, name)
+    return any(
+        cache.lpos(cache.make_key(key.format(company)), entry) is not None
+        for key in (QUEUE_KEY, PROCESSING_KEY)
+    )
+
+
+def schedule_retry(doctype, name, company, error):
+    """Retry with exponential backoff, or park the document as failed after MAX_ATTEMPTS"""
+    cache = frappe.cache()
+    entry = get_queue_entry(doctype, name)
+    attempts = cint((cache.hget(RETRY_KEY, entry) or {}).get("attempts")) + 1
+
+    state = {
+        "doctype": doctype,
+        "name": name,
+        "company": company,
+        "attempts": attempts,
+        "error": error
+    }
+
+    if attempts >= MAX_ATTEMPTS:
+        cache.hdel(RETRY_KEY, entry)
+        cache.hset(FAILED_KEY, entry, {**state, "failed_at": str(now_datetime())})
+        frappe.log_error(f"Deferred submission of {doctype} {name} failed {attempts} times: {error}", "Deferred Submission Error")
+        return
+
+    backoff = min(BASE_BACKOFF_SECONDS * 2 ** (attempts - 1), MAX_BACKOFF_SECONDS)
+    state["next_attempt_at"] = str(add_to_date(now_datetime(), seconds=backoff))
+    cache.hset(RETRY_KEY, entry, state)
+
+
+def requeue_due_retries():
+    """Scheduler: put documents whose backoff has elapsed back on their company queue"""
+    cache = frappe.cache()
+    now = now_datetime()
+    companies = set()
+
+    for entry, state in (cache.hgetall(RETRY_KEY) or {}).items():
+        if get_datetime(state["next_attempt_at"]) > now:
+            continue
+        # The retry state stays until the submission succeeds, it carries the attempt count
+        cache.rpush(QUEUE_KEY.format(state["company"]), frappe.safe_decode(entry))
+        cache.hset(RETRY_KEY, frappe.safe_decode(entry), {**state, "next_attempt_at": str(add_to_date(now, seconds=MAX_BACKOFF_SECONDS))})
+        companies.add(state["company"])
+
+    # Also pick up queues whose job was lost, e.g. after a worker restart, along
+    # with the entries that job had taken but not finished
+    for company in cache.smembers(COMPANIES_KEY) or []:
+        company = frappe.safe_decode(company)
+        requeue_orphaned_entries(company)
+        if cache.llen(QUEUE_KEY.format(company)):
+            companies.add(company)
+        elif not cache.llen(PROCESSING_KEY.format(company)):
+            cache.srem(COMPANIES_KEY, company)
+
+    for company in companies:
+        enqueue_company(company)
+
+
+def get_queue_status(company):
+    cache = frappe.cache()
+    retrying = [state for state in (cache.hgetall(RETRY_KEY) or {}).values() if state["company"] == company]
+    failed = [state for state in (cache.hgetall(FAILED_KEY) or {}).values() if state["company"] == company]
+    return {
+        "company": company,
+        "pending": cache.llen(QUEUE_KEY.format(company)),
+        "processing": cache.llen(PROCESSING_KEY.format(company)),
+        "retrying": retrying,
+        "failed": failed
+    }
+
+
+@frappe.whitelist()
+def get_submission_queue_status(company=None):
+    """
+    Get the deferred submission queue of a company
+
+    Args:
+        company: Company name (optional, defaults to the user's default company)
+
+    Returns:
+        Response with the number of pending documents and the retrying and failed ones
+    """
+    try:
+        permissions = resolve_user_permissions()
+        company = company or permissions.get_default("Company")
+        if not company:
+            frappe.throw(_("Company is required"))
+        if permissions.get_allowed("Company") and not permissions.is_allowed("Company", company):
+            frappe.throw(_("You do not have access to this company"), frappe.PermissionError)
+
+        create_response(
+            status=200,
+            message=_("Submission queue status retrieved successfully"),
+            data=get_queue_status(company)
+        )
+        return
+
+    except frappe.PermissionError as e:
+        create_response(status=403, message=str(e))
+        return
+
+    except Exception as e:
+        frappe.log_error("Submission Queue Status Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+@frappe.whitelist()
+def get_submission_status(doctype, name):
+    """
+    Get where a deferred document is: "submitted", "queued", "retrying", "failed",
+    "cancelled", or "draft" for a draft that is not on the queue
+
+    Args:
+        doctype: DocType of the document
+        name: Document name
+
+    Returns:
+        Response with the status and, when retrying or failed, the attempts and last error
+    """
+    try:
+        doc = frappe.get_doc(doctype, name)
+        doc.check_permission("read")
+
+        cache = frappe.cache()
+        entry = get_queue_entry(doctype, name)
+        state = {}
+        if doc.docstatus == 1:
+            status = "submitted"
+        elif doc.docstatus == 2:
+            status = "cancelled"
+        elif cache.hget(FAILED_KEY, entry):
+            status, state = "failed", cache.hget(FAILED_KEY, entry)
+        elif cache.hget(RETRY_KEY, entry):
+            status, state = "retrying", cache.hget(RETRY_KEY, entry)
+        elif is_enqueued(doctype, name, doc.company):
+            status = "queued"
+        else:
+            status = "draft"
+
+        create_response(
+            status=200,
+            message=_("Submission status retrieved successfully"),
+            data={
+                "doctype": doctype,
+                "name": name,
+                "status": status,
+                "attempts": state.get("attempts", 0),
+                "error": state.get("error"),
+                "next_attempt_at": state.get("next_attempt_at")
+            }
+        )
+        return
+
+    except frappe.PermissionError as e:
+        create_response(status=403, message=str(e))
+        return
+
+    except Exception as e:
+        frappe.log_error("Submission Status Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+@frappe.whitelist()
+def retry_failed_submission(doctype, name):
+    """Admin endpoint to put a failed deferred submission back on its queue"""
+    try:
+        frappe.only_for("System Manager")
+
+        cache = frappe.cache()
+        entry = get_queue_entry(doctype, name)
+        state = cache.hget(FAILED_KEY, entry)
+        if not state:
+            frappe.throw(_("{0} {1} has no failed submission").format(doctype, name))
+
+        cache.hdel(FAILED_KEY, entry)
+        cache.rpush(QUEUE_KEY.format(state["company"]), entry)
+        cache.sadd(COMPANIES_KEY, state["company"])
+        enqueue_company(state["company"])
+
+        create_response(
+            status=200,
+            message=_("Submission queued again"),
+            data={"doctype": doctype, "name": name}
+        )
+        return
+
+    except Exception as e:
+        frappe.log_error("Retry Submission Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
@@ -0,0 +1,210 @@
+import base64
+import json
+
+import frappe
+from frappe import _
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+from havano_company.apis.user_permissions import resolve_user_permissions
+from havano_company.apis.utils import create_response, decode_cursor, encode_cursor
+
+# Rows committed by long transactions can carry a `modified` slightly older
+# than the moment we read, so every watermark overlaps the previous window.
+# Tills upsert by item_code, so replaying a few rows is harmless.
+SYNC_OVERLAP_SECONDS = 60
+DEFAULT_SYNC_LIMIT = 5000
+
+
+def make_watermark(timestamp=None):
+    """
+    Issue an opaque sync watermark
+
+    Args:
+        timestamp: Point in time the watermark stands for (defaults to now minus the overlap window)
+
+    Returns:
+        str: Watermark to hand back to the till
+    """
+    if timestamp is None:
+        timestamp = add_to_date(now_datetime(), seconds=-SYNC_OVERLAP_SECONDS)
+
+    value = get_datetime(timestamp).strftime("%Y-%m-%d %H:%M:%S.%f")
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def parse_watermark(watermark):
+    """
+    Decode a watermark issued by `make_watermark`
+
+    Raises:
+        frappe.ValidationError: If the watermark was not issued by this server
+    """
+    try:
+        return get_datetime(base64.urlsafe_b64decode(watermark.encode()).decode())
+    except Exception:
+        frappe.throw(_("Invalid sync watermark"), frappe.ValidationError)
+
+
+def get_changed_warehouse_items(warehouse, since=None, limit=DEFAULT_SYNC_LIMIT, after=None):
+    """
+    Get items of a warehouse whose Item or Bin row changed since a point in time
+
+    Args:
+        warehouse: Warehouse name
+        since: Datetime to compare `modified` against (None returns every item)
+        limit: Maximum number of rows to return
+        after: (modified, item_code) of the last row of the previous page (optional)
+
+    Returns:
+        list: Rows ordered by their latest modification, then item code
+    """
+    since = since or get_datetime("1900-01-01")
+    values = {"warehouse": warehouse, "since": since, "limit": cint(limit)}
+
+    keyset_condition = ""
+    if after:
+        values["after_modified"], values["after_item_code"] = after
+        keyset_condition = """
+            AND (GREATEST(item.modified, bin.modified) > %(after_modified)s
+                OR (GREATEST(item.modified, bin.modified) = %(after_modified)s
+                    AND item.item_code > %(after_item_code)s))"""
+
+    return frappe.db.sql(f"""
+        SELECT
+            item.item_code,
+            item.item_name,
+            item.description,
+            item.stock_uom,
+            item.disabled,
+            bin.actual_qty,
+            bin.projected_qty,
+            GREATEST(item.modified, bin.modified) AS modified
+        FROM `tabBin` bin
+        INNER JOIN `tabItem` item ON item.item_code = bin.item_code
+        WHERE bin.warehouse = %(warehouse)s
+            AND bin.item_code IN (
+                SELECT changed.item_code FROM (
+                    SELECT item_code FROM `tabBin`
+                    WHERE warehouse = %(warehouse)s AND modified >= %(since)s
+                    UNION
+                    SELECT name FROM `tabItem`
+                    WHERE modified >= %(since)s
+                ) changed
+            ){keyset_condition}
+        ORDER BY modified, item.item_code
+        LIMIT %(limit)s
+    """, values, as_dict=True)
+
+
+def get_tombstones(warehouse, since):
+    """
+    Get item codes deleted since a point in time, either as an Item or as a Bin of the warehouse
+
+    Args:
+        warehouse: Warehouse name
+        since: Datetime of the last sync
+
+    Returns:
+        list: Tombstones with item_code, doctype and deleted_on
+    """
+    deleted = frappe.get_all("Deleted Document",
+        filters={
+            "deleted_doctype": ["in", ["Item", "Bin"]],
+            "creation": [">=", since]
+        },
+        fields=["deleted_doctype", "deleted_name", "data", "creation"],
+        order_by="creation asc",
+        ignore_permissions=True
+    )
+
+    tombstones = []
+    for row in deleted:
+        item_code = row.deleted_name
+        if row.deleted_doctype == "Bin":
+            data = json.loads(row.data or "{}")
+            if data.get("warehouse") != warehouse:
+                continue
+            item_code = data.get("item_code")
+
+        tombstones.append({
+            "item_code": item_code,
+            "doctype": row.deleted_doctype,
+            "deleted_on": row.creation
+        })
+
+    return tombstones
+
+
+@frappe.whitelist()
+def get_warehouse_items_delta(watermark=None, warehouse=None, limit=DEFAULT_SYNC_LIMIT, cursor=None):
+    """
+    Delta sync of `warehouse_items` for a till's local catalog
+
+    Args:
+        watermark: Watermark returned by login or a previous sync (optional, omit for a full load)
+        warehouse: Warehouse to sync (optional, defaults to the user's default warehouse)
+        limit: Maximum number of changed rows per call (optional)
+        cursor: Cursor returned with `has_more`, to fetch the next page (optional)
+
+    Returns:
+        Response with changed items, tombstones and the next watermark. When `has_more`
+        is set the till should call again straight away with the same watermark and the
+        returned cursor; the last page carries the watermark for the next sync.
+    """
+    try:
+        user = frappe.session.user
+        if user == "Guest":
+            frappe.throw(_("Please login to sync items"), frappe.PermissionError)
+
+        from havano_company.apis.bootstrap import get_bootstrap
+
+        if not warehouse:
+            warehouse = get_bootstrap(user)["warehouse"]
+        elif not resolve_user_permissions(user).is_allowed("Warehouse", warehouse):
+            frappe.throw(_("You do not have access to this warehouse"), frappe.PermissionError)
+
+        if not warehouse:
+            frappe.throw(_("No default warehouse set for this user"))
+
+        limit = min(cint(limit) or DEFAULT_SYNC_LIMIT, DEFAULT_SYNC_LIMIT)
+        since = parse_watermark(watermark) if watermark else None
+
+        # Pages resume after (modified, item_code) of the last row sent, so rows
+        # sharing one `modified` are never repeated. The next watermark is fixed
+        # when the first page is read and carried through the cursor.
+        after = None
+        if cursor:
+            next_watermark, after_modified, after_item_code = decode_cursor(cursor)
+            after = (get_datetime(after_modified), after_item_code)
+        else:
+            next_watermark = make_watermark()
+
+        items = get_changed_warehouse_items(warehouse, since, limit, after)
+        tombstones = get_tombstones(warehouse, since) if since and not cursor else []
+
+        has_more = len(items) >= limit
+        next_cursor = encode_cursor(next_watermark, items[-1].modified, items[-1].item_code) if has_more else None
+
+        create_response(
+            status=200,
+            message=_("Warehouse items synced successfully"),
+            data={
+                "warehouse": warehouse,
+                "items": items,
+                "tombstones": tombstones,
+                "watermark": watermark if has_more else next_watermark,
+                "cursor": next_cursor,
+                "has_more": has_more,
+                "full_load": since is None
+            }
+        )
+        return
+
+    except frappe.PermissionError as e:
+        create_response(status=403, message=str(e))
+        return
+
+    except Exception as e:
+        frappe.log_error("Warehouse Items Sync Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
@@ -0,0 +1,137 @@
+from dataclasses import dataclass, field
+
+import frappe
+
+BULK_INSERT_CHUNK_SIZE = 500
+
+
+@dataclass
+class UserPermissions:
+    """
+    Every User Permission of a user, resolved in a single query
+
+    Attributes:
+        user: User the permissions belong to
+        allowed: Allowed values per doctype, e.g. {"Warehouse": ["Stores - ABC", ...]}
+        defaults: Default value per doctype (rows with is_default set)
+        rows: The raw User Permission rows, oldest first
+    """
+    user: str
+    allowed: dict[str, list[str]] = field(default_factory=dict)
+    defaults: dict[str, str] = field(default_factory=dict)
+    rows: list[dict] = field(default_factory=list)
+
+    def get_allowed(self, doctype):
+        """Values of `doctype` the user is restricted to"""
+        return self.allowed.get(doctype, [])
+
+    def get_default(self, doctype):
+        """Default value of `doctype`, or None if the user has no default"""
+        return self.defaults.get(doctype)
+
+    def is_allowed(self, doctype, value):
+        """Whether the user holds a permission for `value` of `doctype`"""
+        return value in self.allowed.get(doctype, [])
+
+    def get_rows(self, doctype):
+        """Raw User Permission rows for `doctype`"""
+        return [row for row in self.rows if row.allow == doctype]
+
+
+def resolve_user_permissions(user=None):
+    """
+    Resolve all User Permissions of a user in one query
+
+    Args:
+        user: User name (optional, defaults to the session user)
+
+    Returns:
+        UserPermissions: Allowed values and defaults per doctype
+    """
+    user = user or frappe.session.user
+    permissions = UserPermissions(user=user)
+
+    permissions.rows = frappe.get_all("User Permission",
+        filters={"user": user},
+        fields=["name", "allow", "for_value", "is_default", "apply_to_all_doctypes", "creation"],
+        order_by="creation asc",
+        ignore_permissions=True
+    )
+
+    for row in permissions.rows:
+        permissions.allowed.setdefault(row.allow, []).append(row.for_value)
+        if row.is_default:
+            permissions.defaults.setdefault(row.allow, row.for_value)
+
+    return permissions
+
+
+def add_user_permissions(permissions, commit=True):
+    """
+    Insert User Permissions in bulk.
+
+    Rows already present are filtered out with a single query, the rest go in as
+    multi-row inserts. At most one default is kept per user and allow type.
+
+    Args:
+        permissions: Iterable of (user, allow, for_value, is_default, apply_to_all_doctypes) tuples
+        commit: Commit once after inserting (default True)
+
+    Returns:
+        list: Names of the inserted User Permissions
+    """
+    from frappe.core.doctype.user_permission.user_permission import clear_user_permissions_cache
+
+    from havano_company.apis.bootstrap import invalidate_user
+    from havano_company.apis.company import clear_user_companies_cache
+
+    requested = {}
+    for user, allow, for_value, is_default, apply_to_all_doctypes in permissions:
+        requested.setdefault((user, allow, for_value), (is_default, apply_to_all_doctypes))
+    if not requested:
+        return []
+
+    users = {user for user, _allow, _value in requested}
+    existing = frappe.get_all("User Permission",
+        filters={"user": ["in", list(users)]},
+        fields=["user", "allow", "for_value", "is_default"],
+        ignore_permissions=True
+    )
+    existing_keys = {(row.user, row.allow, row.for_value) for row in existing}
+    has_default = {(row.user, row.allow) for row in existing if row.is_default}
+
+    timestamp = frappe.utils.now()
+    owner = frappe.session.user
+    values = []
+    for (user, allow, for_value), (is_default, apply_to_all_doctypes) in requested.items():
+        if (user, allow, for_value) in existing_keys:
+            continue
+
+        is_default = 1 if is_default and (user, allow) not in has_default else 0
+        if is_default:
+            has_default.add((user, allow))
+
+        values.append((
+            frappe.generate_hash(length=10), timestamp, timestamp, owner, owner,
+            user, allow, for_value, is_default, 1 if apply_to_all_doctypes else 0
+        ))
+
+    if values:
+        frappe.db.bulk_insert(
+            "User Permission",
+            fields=["name", "creation", "modified", "owner", "modified_by",
+                    "user", "allow", "for_value", "is_default", "apply_to_all_doctypes"],
+            values=values,
+            chunk_size=BULK_INSERT_CHUNK_SIZE
+        )
+
+    if commit:
+        frappe.db.commit()
+
+    # Bulk inserts skip doc_events, so caches are cleared here, once per user
+    for user in {row[5] for row in values}:
+        clear_user_permissions_cache(user)
+        invalidate_user(user)
+        clear_user_companies_cache(user)
+
+    return [row[0] for row in values]
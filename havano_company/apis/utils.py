@@ -1,6 +1,13 @@
+import base64
+import json
+import random
+
 import frappe
 from frappe import _
 
+from havano_company.apis.user_permissions import resolve_user_permissions
+
+
 def create_response(status,message,data=None):
     frappe.local.response.http_status_code = status
     frappe.local.response.message = message
@@ -36,11 +43,7 @@ def check_user_has_company():
     
     # Check if user is assigned to the company (via User Permission)
     if company_registration.get("company"):
-        is_assigned = frappe.db.exists("User Permission", {
-            "user": user,
-            "allow": "Company",
-            "for_value": company_registration.company
-        })
+        is_assigned = resolve_user_permissions(user).is_allowed("Company", company_registration.company)
         
         if not is_assigned:
             frappe.throw(_("You are not assigned to this company. Please contact administrator."), frappe.ValidationError)
@@ -75,4 +78,47 @@ def require_company_registration(func):
                 message=str(e)
             )
             return
-    return wrapper
\ No newline at end of file
+    return wrapper
+
+def encode_cursor(*values):
+    """
+    Encode the keyset of the last row of a page into an opaque cursor
+
+    Args:
+        values: Sort key values of the last row, e.g. (creation, name)
+
+    Returns:
+        str: Cursor to pass back for the next page
+    """
+    return base64.urlsafe_b64encode(frappe.as_json(list(values), indent=None).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor made by `encode_cursor`
+
+    Raises:
+        frappe.ValidationError: If the cursor is malformed
+    """
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except Exception:
+        frappe.throw(_("Invalid cursor"), frappe.ValidationError)
+
+
+DEFAULT_DEBUG_SAMPLE_RATE = 0.01
+
+
+def log_sampled(message, logger="havano_company"):
+    """
+    Write a debug line for a sample of calls only, never to the database
+
+    The rate comes from `havano_debug_sample_rate` in site config (0 to 1).
+
+    Args:
+        message: Message to log
+        logger: Logger name (optional)
+    """
+    rate = frappe.conf.get("havano_debug_sample_rate", DEFAULT_DEBUG_SAMPLE_RATE)
+    if random.random() < float(rate):
+        frappe.logger(logger).debug(message)
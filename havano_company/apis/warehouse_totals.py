@@ -0,0 +1,191 @@
+import frappe
+from frappe import _
+from frappe.utils import flt, now
+
+from havano_company.apis.utils import create_response
+
+DIRTY_WAREHOUSES_KEY = "havano_warehouse_totals_dirty"
+DRIFT_TOLERANCE = 0.001
+
+
+def refresh_warehouse_totals(warehouses=None):
+    """
+    Recompute Warehouse Stock Total rows from Bin in one statement
+
+    Args:
+        warehouses: Warehouses to refresh (optional, defaults to every warehouse)
+    """
+    if warehouses is not None and not warehouses:
+        return
+
+    timestamp = now()
+    condition = "WHERE w.name IN %(warehouses)s" if warehouses else ""
+    frappe.db.sql(f"""
+        INSERT INTO `tabWarehouse Stock Total`
+            (name, creation, modified, owner, modified_by,
+             warehouse, company, total_quantity, total_value, item_count, last_refreshed)
+        SELECT
+            w.name, %(timestamp)s, %(timestamp)s, 'Administrator', 'Administrator',
+            w.name, w.company,
+            COALESCE(SUM(bin.actual_qty), 0), COALESCE(SUM(bin.stock_value), 0), COUNT(bin.name),
+            %(timestamp)s
+        FROM `tabWarehouse` w
+        LEFT JOIN `tabBin` bin ON bin.warehouse = w.name
+        {condition}
+        GROUP BY w.name, w.company
+        ON DUPLICATE KEY UPDATE
+            company = VALUES(company),
+            total_quantity = VALUES(total_quantity),
+            total_value = VALUES(total_value),
+            item_count = VALUES(item_count),
+            last_refreshed = VALUES(last_refreshed),
+            modified = VALUES(modified)
+    """, {"warehouses": list(warehouses or []), "timestamp": timestamp})
+
+
+def refresh_dirty_warehouses():
+    """Scheduler: refresh the warehouses touched by stock transactions since the last run"""
+    cache = frappe.cache()
+    warehouses = [frappe.safe_decode(w) for w in cache.smembers(DIRTY_WAREHOUSES_KEY)]
+    if not warehouses:
+        return
+
+    cache.srem(DIRTY_WAREHOUSES_KEY, *warehouses)
+    refresh_warehouse_totals(warehouses)
+    frappe.db.commit()
+
+
+def find_warehouse_totals_drift():
+    """
+    Compare Warehouse Stock Total against a fresh aggregate of Bin
+
+    Returns:
+        list: Warehouses whose stored totals differ, with stored and actual values
+    """
+    rows = frappe.db.sql("""
+        SELECT
+            w.name AS warehouse,
+            t.name AS total_row,
+            COALESCE(t.total_quantity, 0) AS stored_quantity,
+            COALESCE(t.total_value, 0) AS stored_value,
+            COALESCE(t.item_count, 0) AS stored_item_count,
+            COALESCE(bins.total_quantity, 0) AS actual_quantity,
+            COALESCE(bins.total_value, 0) AS actual_value,
+            COALESCE(bins.item_count, 0) AS actual_item_count
+        FROM `tabWarehouse` w
+        LEFT JOIN `tabWarehouse Stock Total` t ON t.name = w.name
+        LEFT JOIN (
+            SELECT warehouse, SUM(actual_qty) AS total_quantity, SUM(stock_value) AS total_value, COUNT(*) AS item_count
+            FROM `tabBin`
+            GROUP BY warehouse
+        ) bins ON bins.warehouse = w.name
+    """, as_dict=True)
+
+    return [
+        row for row in rows
+        if not row.total_row
+        or abs(flt(row.stored_quantity) - flt(row.actual_quantity)) > DRIFT_TOLERANCE
+        or abs(flt(row.stored_value) - flt(row.actual_value)) > DRIFT_TOLERANCE
+        or row.stored_item_count != row.actual_item_count
+    ]
+
+
+def reconcile_warehouse_totals():
+    """
+    Rebuild the warehouses whose totals drifted from Bin and report them
+
+    Returns:
+        list: The drifted warehouses as found before the rebuild
+    """
+    drift = find_warehouse_totals_drift()
+    if drift:
+        refresh_warehouse_totals([row.warehouse for row in drift])
+        frappe.db.commit()
+        frappe.logger().warning(f"Warehouse Stock Total drifted for {len(drift)} warehouses: {drift}")
+
+    return drift
+
+
+@frappe.whitelist()
+def check_warehouse_totals(fix=0):
+    """
+    Admin endpoint reporting warehouses whose Warehouse Stock Total differs from Bin
+
+    Args:
+        fix: Rebuild the drifted warehouses (default 0, report only)
+
+    Returns:
+        Response with the drifted warehouses
+    """
+    try:
+        frappe.only_for("System Manager")
+
+        drift = reconcile_warehouse_totals() if frappe.utils.cint(fix) else find_warehouse_totals_drift()
+
+        create_response(
+            status=200,
+            message=_("Warehouse totals checked successfully"),
+            data={
+                "drifted": len(drift),
+                "fixed": bool(frappe.utils.cint(fix)),
+                "warehouses": drift
+            }
+        )
+        return
+
+    except Exception as e:
+        frappe.log_error("Warehouse Totals Check Error", frappe.get_traceback())
+        create_response(status=400, message=str(e))
+        return
+
+
+# Doc events
+# ----------
+
+def on_bin_update(doc, method=None):
+    """Apply the Bin's change in quantity and value to its warehouse total"""
+    if not frappe.db.exists("Warehouse Stock Total", doc.warehouse):
+        refresh_warehouse_totals([doc.warehouse])
+        return
+
+    before = doc.get_doc_before_save()
+    apply_bin_delta(
+        doc.warehouse,
+        flt(doc.actual_qty) - flt(before.actual_qty if before else 0),
+        flt(doc.stock_value) - flt(before.stock_value if before else 0),
+        0 if before else 1
+    )
+
+
+def on_bin_trash(doc, method=None):
+    apply_bin_delta(doc.warehouse, -flt(doc.actual_qty), -flt(doc.stock_value), -1)
+
+
+def apply_bin_delta(warehouse, quantity, value, item_count):
+    frappe.db.sql("""
+        UPDATE `tabWarehouse Stock Total`
+        SET total_quantity = total_quantity + %(quantity)s,
+            total_value = total_value + %(value)s,
+            item_count = item_count + %(item_count)s,
+            modified = %(timestamp)s
+        WHERE name = %(warehouse)s
+    """, {"warehouse": warehouse, "quantity": quantity, "value": value, "item_count": item_count, "timestamp": now()})
+
+
+def on_stock_ledger_entry_change(doc, method=None):
+    """
+    ERPNext updates Bin through db.set_value, which skips Bin hooks, so the
+    warehouse is queued for refresh_dirty_warehouses instead. Queued after commit,
+    so a refresh running in between cannot read the Bin before it changes.
+    """
+    warehouse = doc.warehouse
+    frappe.db.after_commit.add(lambda: frappe.cache().sadd(DIRTY_WAREHOUSES_KEY, warehouse))
+
+
+def on_warehouse_trash(doc, method=None):
+    frappe.db.delete("Warehouse Stock Total", {"name": doc.name})
+
+
+def on_warehouse_rename(doc, method=None, old=None, new=None, merge=False):
+    frappe.db.delete("Warehouse Stock Total", {"name": old})
+    refresh_warehouse_totals([new])
@@ -1,9 +1,95 @@
 # Copyright (c) 2025, nasirucode and Contributors
 # See license.txt
 
-# import frappe
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
 from frappe.tests.utils import FrappeTestCase
 
+from havano_company.apis.provisioning import run_provisioning
+
+# Enough to interleave Company inserts; each registration builds a full chart of accounts
+PARALLEL_REGISTRATIONS = 4
+
 
 class TestCompanyRegistration(FrappeTestCase):
-	pass
+	def test_parallel_registrations_do_not_deadlock(self):
+		# Unique per run, so a run that died before its cleanup does not collide
+		run_id = frappe.generate_hash(length=6)
+		registrations = [
+			make_registration(f"_Test Parallel Org {run_id} {i}") for i in range(PARALLEL_REGISTRATIONS)
+		]
+		frappe.db.commit()
+		# Provisioning commits from other threads, so the rollback of FrappeTestCase does not undo it
+		self.addCleanup(delete_registrations, registrations)
+
+		site = frappe.local.site
+		with ThreadPoolExecutor(max_workers=PARALLEL_REGISTRATIONS) as executor:
+			list(executor.map(lambda name: provision_in_thread(site, name), registrations))
+
+		results = frappe.get_all(
+			"Company Registration",
+			filters={"name": ["in", registrations]},
+			fields=["name", "company", "provisioning_status", "provisioning_error"],
+		)
+		for row in results:
+			self.assertEqual(row.provisioning_status, "Completed", row.provisioning_error)
+			self.assertTrue(row.company)
+
+		abbrs = frappe.get_all(
+			"Company", filters={"name": ["in", [row.company for row in results]]}, pluck="abbr"
+		)
+		self.assertEqual(len(abbrs), PARALLEL_REGISTRATIONS)
+		self.assertEqual(len(set(abbrs)), PARALLEL_REGISTRATIONS)
+
+
+def make_registration(organization_name):
+	email = f"{frappe.scrub(organization_name)}@example.com"
+	if not frappe.db.exists("User", email):
+		frappe.get_doc(
+			{"doctype": "User", "email": email, "first_name": organization_name, "send_welcome_email": 0}
+		).insert(ignore_permissions=True)
+
+	return (
+		frappe.get_doc(
+			{
+				"doctype": "Company Registration",
+				"organization_name": organization_name,
+				"email": email,
+				"country": "United States",
+				"status": "Created",
+				"user_created": email,
+				"provisioning_status": "Queued",
+			}
+		)
+		.insert(ignore_permissions=True)
+		.name
+	)
+
+
+def delete_registrations(registrations):
+	rows = frappe.get_all(
+		"Company Registration",
+		filters={"name": ["in", registrations]},
+		fields=["name", "company", "user_created"],
+	)
+	for row in rows:
+		if row.company:
+			frappe.db.delete("Customer", {"customer_name": f"cust-{row.company}"})
+		if row.user_created:
+			frappe.db.delete("User Permission", {"user": row.user_created})
+			frappe.delete_doc("User", row.user_created, force=True, ignore_permissions=True)
+		frappe.delete_doc("Company Registration", row.name, force=True, ignore_permissions=True)
+		if row.company and frappe.db.exists("Company", row.company):
+			frappe.delete_doc("Company", row.company, force=True, ignore_permissions=True)
+	frappe.db.commit()
+
+
+def provision_in_thread(site, registration):
+	frappe.init(site=site)
+	frappe.connect()
+	frappe.set_user("Administrator")
+	try:
+		run_provisioning(registration)
+	finally:
+		frappe.destroy()
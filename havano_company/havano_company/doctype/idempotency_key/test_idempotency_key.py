@@ -0,0 +1,60 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from havano_company.apis import idempotency
+from havano_company.apis.idempotency import (
+	claim_idempotency_key,
+	complete_idempotency_key,
+	get_idempotency_reference,
+)
+
+
+class TestIdempotencyKey(FrappeTestCase):
+	def setUp(self):
+		self.key = f"_test-{frappe.generate_hash(length=10)}"
+
+	def test_claim_then_replay(self):
+		self.assertIsNone(claim_idempotency_key(self.key, "Sales Invoice"))
+		complete_idempotency_key(self.key, "ACC-SINV-0001")
+
+		existing = claim_idempotency_key(self.key, "Sales Invoice")
+		self.assertEqual(existing.reference_doctype, "Sales Invoice")
+		self.assertEqual(existing.reference_name, "ACC-SINV-0001")
+
+	def test_keys_are_scoped_per_user(self):
+		self.assertIsNone(claim_idempotency_key(self.key, "Sales Invoice"))
+
+		frappe.set_user("Guest")
+		try:
+			self.assertIsNone(get_idempotency_reference(self.key))
+		finally:
+			frappe.set_user("Administrator")
+
+	def test_lost_race_returns_the_winning_claim(self):
+		# The winner's row exists, but this transaction's first read does not see it
+		self.assertIsNone(claim_idempotency_key(self.key, "Sales Invoice"))
+		real_get_reference = idempotency.get_idempotency_reference
+		calls = []
+
+		def stale_snapshot(key, for_update=False):
+			calls.append(for_update)
+			return real_get_reference(key, for_update=True) if for_update else None
+
+		with patch.object(idempotency, "get_idempotency_reference", side_effect=stale_snapshot):
+			existing = claim_idempotency_key(self.key, "Sales Invoice")
+
+		self.assertEqual(existing.reference_doctype, "Sales Invoice")
+		self.assertEqual(calls, [False, True])
+
+	def test_lost_race_never_returns_none(self):
+		with (
+			patch.object(idempotency, "get_idempotency_reference", return_value=None),
+			patch("frappe.model.document.Document.insert", side_effect=frappe.DuplicateEntryError),
+		):
+			with self.assertRaises(frappe.ValidationError):
+				claim_idempotency_key(self.key, "Sales Invoice")
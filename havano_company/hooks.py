@@ -20,17 +20,6 @@ app_license = "mit"
 # 		"has_permission": "havano_company.api.permission.has_app_permission"
 # 	}
 # ]
-doc_events = {
-    "POS Opening Entry": {
-        "after_insert": "havano_pos_integration.api.submit_pos_opening_entry"
-    },
-    "POS Closing Entry": {
-        "after_insert": "havano_pos_integration.api.submit_pos_closing_entry"
-    },
-    "POS Invoice": {
-        "after_insert": "havano_pos_integration.api.submit_pos_invoice"
-    }
-}
 # Includes in <head>
 # ------------------
 
@@ -157,11 +146,132 @@ doc_events = {
 	# "Company Registration": {
 	# 	"validate": "havano_company.havano_company.web_form.company_registration.company_registration.on_submit"
 	# }
+	"User Permission": {
+		"on_update": [
+			"havano_company.apis.bootstrap.on_user_permission_change",
+			"havano_company.apis.company.on_user_permission_change",
+		],
+		"on_trash": [
+			"havano_company.apis.bootstrap.on_user_permission_change",
+			"havano_company.apis.company.on_user_permission_change",
+		],
+	},
+	"Company": {
+		"on_update": "havano_company.apis.company.on_company_change",
+		"on_trash": "havano_company.apis.company.on_company_change",
+		"after_rename": [
+			"havano_company.apis.company.on_company_change",
+			"havano_company.apis.defaults.on_company_rename",
+		],
+	},
+	"Customer": {
+		"on_update": "havano_company.apis.bootstrap.on_customer_change",
+		"after_insert": "havano_company.apis.defaults.on_customer_change",
+		"after_rename": "havano_company.apis.defaults.on_customer_change",
+		"on_trash": [
+			"havano_company.apis.bootstrap.on_customer_change",
+			"havano_company.apis.defaults.on_customer_change",
+		],
+	},
+	"Cost Center": {
+		"after_insert": "havano_company.apis.defaults.on_dimension_change",
+		"after_rename": "havano_company.apis.defaults.on_dimension_change",
+		"on_trash": "havano_company.apis.defaults.on_dimension_change",
+	},
+	"Warehouse": {
+		"after_insert": "havano_company.apis.defaults.on_dimension_change",
+		"after_rename": [
+			"havano_company.apis.defaults.on_dimension_change",
+			"havano_company.apis.warehouse_totals.on_warehouse_rename",
+		],
+		"on_trash": [
+			"havano_company.apis.defaults.on_dimension_change",
+			"havano_company.apis.warehouse_totals.on_warehouse_trash",
+		],
+	},
+	"Bin": {
+		"on_update": [
+			"havano_company.apis.bootstrap.on_bin_change",
+			"havano_company.apis.bundles.on_stock_change",
+			"havano_company.apis.warehouse_totals.on_bin_update",
+		],
+		"on_trash": [
+			"havano_company.apis.bootstrap.on_bin_change",
+			"havano_company.apis.bundles.on_stock_change",
+			"havano_company.apis.warehouse_totals.on_bin_trash",
+		],
+	},
+	"Stock Ledger Entry": {
+		"on_submit": [
+			"havano_company.apis.bootstrap.on_stock_ledger_entry_change",
+			"havano_company.apis.bundles.on_stock_change",
+			"havano_company.apis.warehouse_totals.on_stock_ledger_entry_change",
+		],
+		"on_cancel": [
+			"havano_company.apis.bootstrap.on_stock_ledger_entry_change",
+			"havano_company.apis.bundles.on_stock_change",
+			"havano_company.apis.warehouse_totals.on_stock_ledger_entry_change",
+		],
+	},
+	"Product Bundle": {
+		"on_update": "havano_company.apis.bundles.on_product_bundle_change",
+		"on_trash": "havano_company.apis.bundles.on_product_bundle_change",
+	},
+	"Item": {
+		"on_update": "havano_company.apis.bootstrap.on_item_change",
+		"on_trash": "havano_company.apis.bootstrap.on_item_change",
+	},
+	"Item Price": {
+		"on_update": "havano_company.apis.pricing.on_item_price_change",
+		"on_trash": "havano_company.apis.pricing.on_item_price_change",
+	},
+	"Price List": {
+		"after_rename": "havano_company.apis.pricing.on_price_list_change",
+		"on_trash": "havano_company.apis.pricing.on_price_list_change",
+	},
+	"Currency Exchange": {
+		"on_update": "havano_company.apis.exchange_rates.on_currency_exchange_change",
+		"on_trash": "havano_company.apis.exchange_rates.on_currency_exchange_change",
+	},
+	"POS Opening Entry": {
+		"after_insert": "havano_company.api.submit_pos_opening_entry",
+	},
+	"POS Closing Entry": {
+		"after_insert": "havano_company.api.submit_pos_closing_entry",
+	},
+	"POS Invoice": {
+		"after_insert": "havano_company.api.submit_pos_invoice",
+	},
+	"Sales Invoice": {
+		"on_submit": "havano_company.apis.sales_summary.on_sales_invoice_submit",
+		"on_cancel": "havano_company.apis.sales_summary.on_sales_invoice_cancel",
+	},
+	"Company Registration": {
+		"on_update": [
+			"havano_company.apis.bootstrap.on_company_registration_change",
+			"havano_company.apis.company.on_company_registration_change",
+		],
+		"on_trash": [
+			"havano_company.apis.bootstrap.on_company_registration_change",
+			"havano_company.apis.company.on_company_registration_change",
+		],
+	},
 }
 
 # Scheduled Tasks
 # ---------------
 
+scheduler_events = {
+	"all": [
+		"havano_company.apis.company_pool.refill_pool",
+		"havano_company.apis.warehouse_totals.refresh_dirty_warehouses",
+		"havano_company.apis.submission_queue.requeue_due_retries",
+	],
+	"hourly": [
+		"havano_company.apis.warehouse_totals.reconcile_warehouse_totals",
+	],
+}
+
 # scheduler_events = {
 # 	"all": [
 # 		"havano_company.tasks.all"
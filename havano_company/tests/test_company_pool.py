@@ -0,0 +1,66 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from havano_company.apis.company_pool import POOL_PREFIX, claim_pooled_company, create_pool_company
+
+POOL_COUNTRY = "United States"
+
+
+class TestCompanyPool(FrappeTestCase):
+	def test_claim_leaves_no_reference_to_the_pool_company(self):
+		create_pool_company(POOL_COUNTRY)
+		# Claims take the oldest pool company of the country, which need not be the one just built
+		pooled = frappe.db.get_value(
+			"Company",
+			{"name": ["like", f"{POOL_PREFIX}%"], "country": POOL_COUNTRY},
+			["name", "abbr"],
+			order_by="creation asc",
+			as_dict=True,
+		)
+
+		company_name = f"_Test Pool Claim {frappe.generate_hash(length=6)}"
+		# Creating and claiming commit, so the rollback of FrappeTestCase does not undo them
+		self.addCleanup(delete_company, company_name)
+		self.assertEqual(claim_pooled_company(company_name, POOL_COUNTRY), company_name)
+
+		abbr = frappe.db.get_value("Company", company_name, "abbr")
+		self.assertNotEqual(abbr, pooled.abbr)
+		self.assertTrue(
+			frappe.db.exists("Account", {"company": company_name, "name": ["like", f"% - {abbr}"]})
+		)
+		self.assertEqual(find_references(pooled.name, pooled.abbr), [])
+
+
+def find_references(name, abbr):
+	"""Every varchar column of every table holding the pool company's name or abbreviation"""
+	columns = frappe.db.sql(
+		"""
+		SELECT table_name, column_name
+		FROM information_schema.columns
+		WHERE table_schema = DATABASE() AND data_type = 'varchar'
+		""",
+		as_list=True,
+	)
+
+	references = []
+	for table, column in columns:
+		if frappe.db.sql(
+			f"""
+			SELECT 1 FROM `{table}`
+			WHERE `{column}` IN (%(name)s, %(abbr)s) OR `{column}` LIKE %(suffix)s
+			LIMIT 1
+			""",
+			{"name": name, "abbr": abbr, "suffix": f"% - {abbr}"},
+		):
+			references.append(f"{table}.{column}")
+
+	return references
+
+
+def delete_company(company):
+	if frappe.db.exists("Company", company):
+		frappe.delete_doc("Company", company, force=True, ignore_permissions=True)
+		frappe.db.commit()
@@ -0,0 +1,80 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from havano_company.api import get_payment_reference_list, validate_payment_references
+
+INVOICE = ("Sales Invoice", "ACC-SINV-0001")
+
+
+def make_references(outstanding_amount=100, docstatus=1, company="_Test Company", party="_Test Customer"):
+	return {
+		INVOICE: frappe._dict(
+			reference_doctype=INVOICE[0],
+			name=INVOICE[1],
+			docstatus=docstatus,
+			company=company,
+			party=party,
+			outstanding_amount=outstanding_amount,
+		)
+	}
+
+
+def make_payment(allocated_amount, **kwargs):
+	return frappe._dict(
+		company="_Test Company",
+		party="_Test Customer",
+		references=[
+			{
+				"reference_doctype": INVOICE[0],
+				"reference_name": INVOICE[1],
+				"allocated_amount": allocated_amount,
+			}
+		],
+		**kwargs,
+	)
+
+
+class TestPaymentReferenceValidation(FrappeTestCase):
+	def test_top_level_reference_is_normalised(self):
+		payment = frappe._dict(
+			reference_doctype=INVOICE[0], reference_name=INVOICE[1], allocated_amount=40, paid_amount=40
+		)
+		self.assertEqual(
+			get_payment_reference_list(payment),
+			[{"reference_doctype": INVOICE[0], "reference_name": INVOICE[1], "allocated_amount": 40}],
+		)
+
+	def test_top_level_reference_is_validated(self):
+		payment = frappe._dict(
+			company="_Test Company",
+			party="_Test Customer",
+			reference_doctype=INVOICE[0],
+			reference_name="ACC-SINV-MISSING",
+			allocated_amount=40,
+		)
+		with self.assertRaises(frappe.ValidationError):
+			validate_payment_references(payment, make_references(), {})
+
+	def test_valid_payment(self):
+		validate_payment_references(make_payment(100), make_references(), {})
+
+	def test_unsubmitted_reference(self):
+		with self.assertRaises(frappe.ValidationError):
+			validate_payment_references(make_payment(10), make_references(docstatus=0), {})
+
+	def test_other_company(self):
+		with self.assertRaises(frappe.ValidationError):
+			validate_payment_references(make_payment(10), make_references(company="_Test Company 1"), {})
+
+	def test_other_party(self):
+		with self.assertRaises(frappe.ValidationError):
+			validate_payment_references(make_payment(10), make_references(party="_Test Customer 1"), {})
+
+	def test_over_allocation_across_the_batch(self):
+		allocated = {INVOICE: 70}
+		validate_payment_references(make_payment(30), make_references(), allocated)
+		with self.assertRaises(frappe.ValidationError):
+			validate_payment_references(make_payment(31), make_references(), allocated)
@@ -0,0 +1,59 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import getdate
+
+from havano_company.apis.pricing import get_price_candidates, pick_price
+
+
+def make_price(rate, valid_from=None, valid_upto=None, modified="2026-01-01 00:00:00"):
+	return frappe._dict(
+		price_list="_Test Price List",
+		item_code="_Test Item",
+		item_name="_Test Item",
+		uom=None,
+		customer=None,
+		price_list_rate=rate,
+		currency="INR",
+		valid_from=getdate(valid_from) if valid_from else None,
+		valid_upto=getdate(valid_upto) if valid_upto else None,
+		modified=modified,
+	)
+
+
+class TestPickPrice(FrappeTestCase):
+	def pick(self, rows, date="2026-06-15"):
+		price = pick_price(get_price_candidates(rows), date)
+		return price["price_list_rate"] if price else None
+
+	def test_latest_valid_from_wins(self):
+		rows = [make_price(10, "2026-01-01"), make_price(20, "2026-06-01"), make_price(30)]
+		self.assertEqual(self.pick(rows), 20)
+
+	def test_future_price_is_ignored(self):
+		rows = [make_price(10, "2026-01-01"), make_price(20, "2026-07-01")]
+		self.assertEqual(self.pick(rows), 10)
+		self.assertEqual(self.pick(rows, "2026-07-01"), 20)
+
+	def test_expired_price_is_ignored(self):
+		rows = [make_price(10), make_price(20, "2026-06-01", "2026-06-10")]
+		self.assertEqual(self.pick(rows), 10)
+		self.assertEqual(self.pick(rows, "2026-06-10"), 20)
+
+	def test_empty_dates_are_open_ended(self):
+		self.assertEqual(self.pick([make_price(10)]), 10)
+		self.assertEqual(self.pick([make_price(10, valid_upto="2026-12-31")]), 10)
+
+	def test_no_valid_price(self):
+		rows = [make_price(10, valid_upto="2026-01-31"), make_price(20, "2026-12-01")]
+		self.assertIsNone(self.pick(rows))
+		self.assertIsNone(pick_price([], "2026-06-15"))
+
+	def test_same_valid_from_latest_modified_wins(self):
+		rows = [
+			make_price(10, "2026-01-01", modified="2026-01-01 10:00:00"),
+			make_price(20, "2026-01-01", modified="2026-02-01 10:00:00"),
+		]
+		self.assertEqual(self.pick(rows), 20)
@@ -0,0 +1,124 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+from unittest.mock import patch
+
+import frappe
+from erpnext.accounts.doctype.pos_invoice.test_pos_invoice import create_pos_invoice
+from erpnext.accounts.doctype.pos_profile.test_pos_profile import make_pos_profile
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from frappe.tests.utils import FrappeTestCase
+
+from havano_company.apis.submission_queue import (
+	FAILED_KEY,
+	MAX_ATTEMPTS,
+	PROCESSING_KEY,
+	QUEUE_KEY,
+	RETRY_KEY,
+	get_queue_entry,
+	process_company_queue,
+	requeue_orphaned_entries,
+	schedule_retry,
+)
+
+
+class TestPOSAutoSubmit(FrappeTestCase):
+	@classmethod
+	def setUpClass(cls):
+		super().setUpClass()
+		make_stock_entry(target="_Test Warehouse - _TC", item_code="_Test Item", qty=100, basic_rate=100)
+		make_pos_profile()
+
+	def test_pos_invoice_stays_draft_without_opt_in(self):
+		with patch.dict(frappe.conf, {"havano_auto_submit_pos": 0, "havano_defer_pos_submission": 0}):
+			invoice = create_pos_invoice(rate=100, do_not_submit=1)
+
+		self.assertEqual(invoice.docstatus, 0)
+		self.assertEqual(frappe.db.get_value("POS Invoice", invoice.name, "docstatus"), 0)
+
+	def test_pos_invoice_of_other_company_stays_draft(self):
+		with patch.dict(frappe.conf, {"havano_auto_submit_pos": ["_Test Company 1"]}):
+			invoice = create_pos_invoice(rate=100, do_not_submit=1)
+
+		self.assertEqual(invoice.docstatus, 0)
+
+	def test_pos_invoice_is_submitted_with_opt_in(self):
+		with patch.dict(
+			frappe.conf, {"havano_auto_submit_pos": ["_Test Company"], "havano_defer_pos_submission": 0}
+		):
+			invoice = create_pos_invoice(rate=100, do_not_submit=1)
+
+		self.assertEqual(invoice.docstatus, 1)
+
+
+class WorkerDied(BaseException):
+	"""Stands in for the job being killed, which no `except Exception` catches"""
+
+
+class TestSubmissionQueue(FrappeTestCase):
+	def setUp(self):
+		self.company = f"_Test Queue Company {frappe.generate_hash(length=6)}"
+		self.addCleanup(self.clear_queue)
+
+	def clear_queue(self):
+		cache = frappe.cache()
+		cache.delete_value(QUEUE_KEY.format(self.company))
+		cache.delete_value(PROCESSING_KEY.format(self.company))
+		for key in (RETRY_KEY, FAILED_KEY):
+			for entry in (cache.hgetall(key) or {}).keys():
+				if frappe.safe_decode(entry).startswith("_Test Queue "):
+					cache.hdel(key, entry)
+
+	def queue(self, names):
+		for name in names:
+			frappe.cache().rpush(QUEUE_KEY.format(self.company), get_queue_entry("_Test Queue Doc", name))
+
+	def entries(self, key):
+		cache = frappe.cache()
+		return [
+			frappe.safe_decode(entry)
+			for entry in cache.lrange(cache.make_key(key.format(self.company)), 0, -1)
+		]
+
+	def test_entries_survive_a_dead_worker(self):
+		names = ["A", "B", "C"]
+		self.queue(names)
+
+		with patch(
+			"havano_company.apis.submission_queue.submit_queued_document",
+			side_effect=[None, WorkerDied()],
+		):
+			with self.assertRaises(WorkerDied):
+				process_company_queue(self.company)
+
+		# A was submitted, B was being submitted and C was taken with the batch
+		self.assertEqual(self.entries(PROCESSING_KEY), ["_Test Queue Doc::B", "_Test Queue Doc::C"])
+
+		with patch("frappe.utils.background_jobs.is_job_enqueued", return_value=True):
+			self.assertEqual(requeue_orphaned_entries(self.company), 0)
+		with patch("frappe.utils.background_jobs.is_job_enqueued", return_value=False):
+			self.assertEqual(requeue_orphaned_entries(self.company), 2)
+
+		self.assertEqual(self.entries(QUEUE_KEY), ["_Test Queue Doc::B", "_Test Queue Doc::C"])
+		self.assertEqual(self.entries(PROCESSING_KEY), [])
+
+	def test_processed_entries_leave_the_processing_list(self):
+		self.queue(["A", "B"])
+		with patch("havano_company.apis.submission_queue.submit_queued_document") as submit:
+			process_company_queue(self.company)
+
+		self.assertEqual(submit.call_count, 2)
+		self.assertEqual(self.entries(QUEUE_KEY), [])
+		self.assertEqual(self.entries(PROCESSING_KEY), [])
+
+	def test_failures_back_off_then_park(self):
+		cache = frappe.cache()
+		entry = get_queue_entry("_Test Queue Doc", "A")
+
+		for attempt in range(1, MAX_ATTEMPTS):
+			schedule_retry("_Test Queue Doc", "A", self.company, "boom")
+			self.assertEqual(cache.hget(RETRY_KEY, entry)["attempts"], attempt)
+
+		schedule_retry("_Test Queue Doc", "A", self.company, "boom")
+		self.assertIsNone(cache.hget(RETRY_KEY, entry))
+		self.assertEqual(cache.hget(FAILED_KEY, entry)["attempts"], MAX_ATTEMPTS)
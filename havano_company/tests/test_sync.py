@@ -0,0 +1,54 @@
+# Copyright (c) 2026, nasirucode and Contributors
+# See license.txt
+
+import frappe
+from erpnext.stock.doctype.item.test_item import make_item
+from erpnext.stock.doctype.stock_entry.stock_entry_utils import make_stock_entry
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import get_datetime
+
+from havano_company.apis.sync import get_changed_warehouse_items
+from havano_company.apis.utils import decode_cursor, encode_cursor
+
+WAREHOUSE = "_Test Warehouse - _TC"
+
+
+class TestCursor(FrappeTestCase):
+	def test_round_trip(self):
+		modified = get_datetime("2026-10-18 12:34:56.123456")
+		watermark, after_modified, item_code = decode_cursor(encode_cursor("watermark", modified, "ITEM-001"))
+
+		self.assertEqual(watermark, "watermark")
+		self.assertEqual(get_datetime(after_modified), modified)
+		self.assertEqual(item_code, "ITEM-001")
+
+	def test_malformed_cursor(self):
+		with self.assertRaises(frappe.ValidationError):
+			decode_cursor("not a cursor")
+
+
+class TestWarehouseItemPaging(FrappeTestCase):
+	def test_rows_sharing_modified_are_paged_once(self):
+		item_codes = [f"_Test Sync Item {i}" for i in range(5)]
+		for item_code in item_codes:
+			make_item(item_code, {"is_stock_item": 1})
+			make_stock_entry(target=WAREHOUSE, item_code=item_code, qty=1, basic_rate=10)
+
+		# More rows than a page share one `modified`, which made `>=` paging loop forever
+		modified = get_datetime("2099-01-01 00:00:00")
+		frappe.db.sql("UPDATE `tabItem` SET modified = %s WHERE name IN %s", (modified, item_codes))
+		frappe.db.sql(
+			"UPDATE `tabBin` SET modified = %s WHERE warehouse = %s AND item_code IN %s",
+			(modified, WAREHOUSE, item_codes),
+		)
+
+		seen = []
+		after = None
+		for _page in range(len(item_codes)):
+			rows = get_changed_warehouse_items(WAREHOUSE, since=modified, limit=2, after=after)
+			if not rows:
+				break
+			seen.extend(row.item_code for row in rows)
+			after = (rows[-1].modified, rows[-1].item_code)
+
+		self.assertEqual(seen, sorted(item_codes))